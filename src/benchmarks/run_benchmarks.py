@@ -0,0 +1,409 @@
+import os
+
+# Run headless: the game modules open a display when imported
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from main_game.drawing import load_and_scale_background_images
+from main_game.game_body import (add_game_limbs, add_limb_sweeps,
+                                 remove_dead_game_limbs, reset_limb_sweeps,
+                                 update_game_body)
+from main_game.globals import (BALL_RADIUS, PHYSICS_HEIGHT, PHYSICS_TIMESTEP,
+                               PHYSICS_WIDTH, RENDER_BACKEND,
+                               SWEPT_LIMB_MAX_SPEED, level_data, physics_space,
+                               present_frame, render_font, screen_height,
+                               screen_width)
+from main_game.main_game import draw_game
+from main_game.physics_budget import apply_level_physics_budget
+from main_game.physics_objects import (add_physics_ball, add_physics_flag,
+                                       add_physics_lines_from_position_list,
+                                       release_swept_colliders)
+from main_game.webcam_and_pose_info import get_webcam_info
+from pose_detection.pose_landmarks import get_pose_lines_from_points
+from utils.clip_lines_within_box import clip_lines_within_box, line_clip
+from utils.scale_and_translate_ellipse import scale_and_translate_ellipse
+from utils.scale_and_translate_lines import scale_and_translate_lines
+
+BENCHMARK_BASELINE_PATH = "benchmarks/baseline.json"
+REGRESSION_THRESHOLD = 1.25
+BENCHMARK_REPEATS = 5
+
+# (x, y) of each of the 33 pose landmarks for a player standing in the middle of the webcam image
+SYNTHETIC_POSE_POINTS = [
+    (0.50, 0.20), (0.49, 0.19), (0.48, 0.19), (0.47, 0.19), (0.51, 0.19), (0.52, 0.19), (0.53, 0.19), (0.45, 0.20), (0.55, 0.20),
+    (0.49, 0.22), (0.51, 0.22), (0.42, 0.30), (0.58, 0.30), (0.38, 0.42), (0.62, 0.42), (0.35, 0.52), (0.65, 0.52), (0.34, 0.54),
+    (0.66, 0.54), (0.35, 0.55), (0.65, 0.55), (0.36, 0.54), (0.64, 0.54), (0.45, 0.55), (0.55, 0.55), (0.44, 0.70), (0.56, 0.70),
+    (0.44, 0.85), (0.56, 0.85), (0.43, 0.87), (0.57, 0.87), (0.46, 0.88), (0.54, 0.88)]
+
+benchmark_cases = {}
+behaviour_checks = {}
+
+
+def benchmark_case(case_name):
+  def register_benchmark_case(case_function):
+    benchmark_cases[case_name] = case_function
+    return case_function
+  return register_benchmark_case
+
+
+def behaviour_check(check_name):
+  # Checks run before the benchmarks, so a change that is faster because it no longer works fails the run
+  def register_behaviour_check(check_function):
+    behaviour_checks[check_name] = check_function
+    return check_function
+  return register_behaviour_check
+
+
+def time_iterations(function, number):
+  start_time = time.perf_counter()
+  for _ in range(number):
+    function()
+  return (time.perf_counter() - start_time) / number
+
+
+def remove_physics_objects(physics_objects):
+  for physics_object in physics_objects:
+    physics_space.remove(*physics_object)
+
+
+def get_synthetic_pose_lines(jitter=0.0):
+  points = [(x + random.uniform(-jitter, jitter), y + random.uniform(-jitter, jitter)) for x, y in SYNTHETIC_POSE_POINTS]
+  return get_pose_lines_from_points(points)
+
+
+def get_synthetic_player_points(player_count, jitter=0.0):
+  # Players stand side by side, each shifted along from the last
+  player_offsets = (np.arange(player_count) - (player_count - 1) / 2) * 0.15
+  player_points = np.array(SYNTHETIC_POSE_POINTS)[np.newaxis].repeat(player_count, axis=0)
+  player_points[:, :, 0] += player_offsets[:, np.newaxis]
+  return player_points + np.array([[[random.uniform(-jitter, jitter), random.uniform(-jitter, jitter)] for _ in SYNTHETIC_POSE_POINTS] for _ in range(player_count)])
+
+
+def get_synthetic_webcam_frame():
+  return np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+
+def get_level_grids(level):
+  return [(tuple(game_pos), tuple(webcam_pos), colour) for game_pos, webcam_pos, colour in level_data[level].get("grids", [])]
+
+
+# --- Benchmark Cases ---
+# Each case returns the time of a single call in seconds
+
+
+@benchmark_case("line_clip")
+def benchmark_line_clip():
+  return time_iterations(lambda: line_clip(((-4, 4), (4, 8)), ((1, 1), (6, 6))), 20000)
+
+
+@benchmark_case("clip_lines_within_box")
+def benchmark_clip_lines_within_box():
+  lines = [((start_x, start_y), (end_x, end_y)) for (start_x, start_y, _), (end_x, end_y, _) in get_synthetic_pose_lines()]
+  return time_iterations(lambda: clip_lines_within_box(lines, ((0.3, 0.3), (0.6, 0.6))), 2000)
+
+
+@benchmark_case("scale_and_translate_lines")
+def benchmark_scale_and_translate_lines():
+  lines = [((start_x, start_y), (end_x, end_y)) for (start_x, start_y, _), (end_x, end_y, _) in get_synthetic_pose_lines()]
+  return time_iterations(lambda: scale_and_translate_lines(lines, ((0.3, 0.3), (0.6, 0.6)), ((0.2, 0.1), (0.7, 0.9))), 2000)
+
+
+@benchmark_case("scale_and_translate_ellipse")
+def benchmark_scale_and_translate_ellipse():
+  return time_iterations(lambda: scale_and_translate_ellipse(((0.5, 0.2), 0.1, 0.15), ((0.3, 0.3), (0.6, 0.6)), ((0.2, 0.1), (0.7, 0.9))), 20000)
+
+
+def benchmark_update_game_body(current_level, player_count=1):
+  grids = get_level_grids(current_level)
+  allow_head = level_data[current_level].get("allow_head", False)
+  player_points_list = [get_synthetic_player_points(player_count, jitter=0.01) for _ in range(16)]
+  player_ids = list(range(player_count))
+
+  game_limbs = []
+  game_heads = []
+  frame = 0
+
+  def update_game_body_frame():
+    nonlocal game_limbs, game_heads, frame
+    player_points = player_points_list[frame % len(player_points_list)]
+    game_limbs, game_heads = update_game_body(game_limbs, game_heads, current_level, player_points, player_ids, grids, allow_head, level_data)
+    frame += 1
+
+  seconds_per_frame = time_iterations(update_game_body_frame, 300)
+
+  remove_physics_objects([line for line, _, _ in game_limbs] + [head[0] for head in game_heads])
+  return seconds_per_frame
+
+
+@benchmark_case("update_game_body[level_2]")
+def benchmark_update_game_body_limbs():
+  return benchmark_update_game_body("level_2")
+
+
+@benchmark_case("update_game_body[level_7]")
+def benchmark_update_game_body_limbs_and_head():
+  return benchmark_update_game_body("level_7")
+
+
+@benchmark_case("update_game_body[level_7_4_players]")
+def benchmark_update_game_body_four_players():
+  return benchmark_update_game_body("level_7", player_count=4)
+
+
+def benchmark_physics_step(ball_count):
+  level_lines = add_physics_lines_from_position_list(level_data["level_1"]["line_pos"])
+  balls = [add_physics_ball((0.05 + 0.9 * (n % 40) / 40, 0.05 + 0.5 * (n // 40) / 40)) for n in range(ball_count)]
+
+  seconds_per_step = time_iterations(lambda: physics_space.step(1 / 60.0), 120)
+
+  remove_physics_objects(balls + level_lines)
+  return seconds_per_step
+
+
+@benchmark_case("physics_step[50_balls]")
+def benchmark_physics_step_50_balls():
+  return benchmark_physics_step(50)
+
+
+@benchmark_case("physics_step[400_balls]")
+def benchmark_physics_step_400_balls():
+  return benchmark_physics_step(400)
+
+
+def benchmark_resting_balls(level_info):
+  # A row of balls that have come to rest on a floor, stepped with the physics budget of level_info
+  floor_lines = add_physics_lines_from_position_list([{"start_pos": [0.02, 0.9], "end_pos": [0.98, 0.9]}])
+  balls = [add_physics_ball((0.03 + 0.94 * n / 60, 0.85)) for n in range(60)]
+  apply_level_physics_budget(level_info)
+  for _ in range(120):
+    physics_space.step(PHYSICS_TIMESTEP)
+
+  seconds_per_step = time_iterations(lambda: physics_space.step(PHYSICS_TIMESTEP), 120)
+
+  remove_physics_objects(balls + floor_lines)
+  physics_space.sleep_time_threshold = float("inf")
+  return seconds_per_step
+
+
+@benchmark_case("physics_step[60_resting]")
+def benchmark_physics_step_resting_balls():
+  return benchmark_resting_balls({"physics_sleep_time": float("inf")})
+
+
+@benchmark_case("physics_step[60_resting_sleeping]")
+def benchmark_physics_step_resting_balls_sleeping():
+  return benchmark_resting_balls({})
+
+
+def benchmark_limb_swing(swept_limbs, physics_substeps):
+  # One physics tick of a player swinging side to side through a crowd of balls, including rebuilding the limbs.
+  # Limbs jump from pose to pose, so without sweeps they have to be rebuilt part way along the swing for every
+  # substep to pass through the balls in between.
+  current_level = "level_2"
+  grids = get_level_grids(current_level)
+  level_lines = add_physics_lines_from_position_list(level_data["level_1"]["line_pos"])
+  balls = [add_physics_ball((0.05 + 0.9 * (n % 40) / 40, 0.3 + 0.4 * (n // 40) / 5)) for n in range(200)]
+  swing_offsets = 0.15 * np.sin(np.linspace(0, 2 * np.pi, 16, endpoint=False))
+  player_points_list = [get_synthetic_player_points(1) + (swing_offset, 0) for swing_offset in swing_offsets]
+
+  reset_limb_sweeps()
+  game_limbs = []
+  frame = 0
+
+  def limb_swing_tick():
+    nonlocal game_limbs, frame
+    previous_player_points = player_points_list[(frame - 1) % len(player_points_list)]
+    player_points = player_points_list[frame % len(player_points_list)]
+    for substep in range(1, physics_substeps + 1):
+      substep_player_points = previous_player_points + (player_points - previous_player_points) * substep / physics_substeps
+      game_limbs = remove_dead_game_limbs(game_limbs)
+      game_limbs = add_game_limbs(level_data, current_level, substep_player_points, [0], grids, game_limbs, swept_limbs)
+      physics_space.step(PHYSICS_TIMESTEP / physics_substeps)
+    release_swept_colliders()
+    frame += 1
+
+  seconds_per_tick = time_iterations(limb_swing_tick, 60)
+
+  remove_physics_objects(balls + level_lines + [line for line, _, _ in game_limbs])
+  return seconds_per_tick
+
+
+@benchmark_case("limb_swing[swept]")
+def benchmark_limb_swing_swept():
+  return benchmark_limb_swing(True, 1)
+
+
+@benchmark_case("limb_swing[4_substeps]")
+def benchmark_limb_swing_4_substeps():
+  return benchmark_limb_swing(False, 4)
+
+
+@benchmark_case("limb_swing[8_substeps]")
+def benchmark_limb_swing_8_substeps():
+  return benchmark_limb_swing(False, 8)
+
+
+def check_limb_sweep(grid_left):
+  # A 60 px upright limb jumps 300 px to the right in one pose, over a block of balls, in a grid starting at
+  # grid_left. Every ball it passed over inside the grid should be knocked along with the swing, not out sideways.
+  grid = ((grid_left, 0, 1 - grid_left, 1), (grid_left, 0, 1 - grid_left, 1), "red")
+  start_x, end_x, top, bottom = 600 / PHYSICS_WIDTH, 900 / PHYSICS_WIDTH, 510 / PHYSICS_HEIGHT, 570 / PHYSICS_HEIGHT
+  ball_positions = [(x / PHYSICS_WIDTH, y / PHYSICS_HEIGHT) for x in range(650, 851, 50) for y in (520, 540, 560) if x / PHYSICS_WIDTH > grid_left + BALL_RADIUS / PHYSICS_WIDTH]
+  balls = [add_physics_ball(ball_position) for ball_position in ball_positions]
+
+  reset_limb_sweeps()
+  for limb_x in (start_x, end_x):
+    limb_line = np.array([[[limb_x, top], [limb_x, bottom]]])
+    add_limb_sweeps("limb_sweep_check", [0], [grid], 1, limb_line, np.array([limb_x >= grid_left]), limb_line)
+  physics_space.step(PHYSICS_TIMESTEP)
+  release_swept_colliders()
+  reset_limb_sweeps()
+
+  failures = [f"ball at {ball_body.position.x:.0f}, {ball_body.position.y:.0f} moving at {ball_body.velocity.x:.0f}, {ball_body.velocity.y:.0f}"
+              for _, ball_body in balls if ball_body.velocity.x < SWEPT_LIMB_MAX_SPEED / 2 or abs(ball_body.velocity.y) > ball_body.velocity.x / 2]
+  remove_physics_objects(balls)
+  return failures
+
+
+@behaviour_check("limb_sweep")
+def check_limb_sweep_within_grid():
+  return check_limb_sweep(0)
+
+
+@behaviour_check("limb_sweep[entering_grid]")
+def check_limb_sweep_entering_grid():
+  return check_limb_sweep(700 / PHYSICS_WIDTH)
+
+
+def benchmark_draw_game(should_present_frame):
+  current_level = "level_7"
+  level_info = level_data[current_level]
+
+  bg_images = load_and_scale_background_images(current_level)
+  grids = get_level_grids(current_level)
+  balls = [add_physics_ball((0.1 + 0.02 * n, 0.05)) for n in range(20)]
+  level_lines = add_physics_lines_from_position_list(level_info["line_pos"])
+  flag = add_physics_flag(tuple(level_info["flag_pos"]))
+  webcam_info = get_webcam_info(get_synthetic_webcam_frame(), current_level)
+
+  game_limbs, game_heads = update_game_body([], [], current_level, get_synthetic_player_points(1), [0], grids, level_info["allow_head"], level_data)
+
+  def draw_game_frame():
+    draw_game(bg_images, current_level, balls, flag, webcam_info, level_lines, game_limbs, game_heads, [],
+              grids, level_info["instruction"], screen_width, screen_height, render_font)
+    if should_present_frame:
+      present_frame()
+
+  seconds_per_frame = time_iterations(draw_game_frame, 60)
+
+  remove_physics_objects(balls + level_lines + [flag] + [line for line, _, _ in game_limbs] + [head[0] for head in game_heads])
+  return seconds_per_frame
+
+
+# Timings of the two render backends are kept apart, as RENDER_BACKEND=sdl2 swaps draw_game and present_frame
+@benchmark_case("draw_game[level_7]" if RENDER_BACKEND == "surface" else f"draw_game[level_7_{RENDER_BACKEND}]")
+def benchmark_draw_game_only():
+  return benchmark_draw_game(False)
+
+
+# The sdl2 backend queues its draw calls and only runs them when the frame is presented, so compare backends with this
+@benchmark_case("draw_and_present_frame[level_7]" if RENDER_BACKEND == "surface" else f"draw_and_present_frame[level_7_{RENDER_BACKEND}]")
+def benchmark_draw_and_present_frame():
+  return benchmark_draw_game(True)
+
+
+@benchmark_case("present_frame" if RENDER_BACKEND == "surface" else f"present_frame[{RENDER_BACKEND}]")
+def benchmark_present_frame():
+  return time_iterations(present_frame, 60)
+
+
+@benchmark_case("get_webcam_info")
+def benchmark_get_webcam_info():
+  webcam_img = get_synthetic_webcam_frame()
+  return time_iterations(lambda: get_webcam_info(webcam_img, "level_7"), 60)
+
+
+# --- Runner ---
+
+
+def run_behaviour_checks(check_filter=None):
+  # Each check returns a list of what went wrong, so returns the number of checks that failed
+  failed_check_count = 0
+  for check_name, check_function in behaviour_checks.items():
+    if check_filter and check_filter not in check_name:
+      continue
+    failures = check_function()
+    print(f"{check_name:<32} {'FAILED' if failures else 'ok':>12}")
+    for failure in failures:
+      print(f"  {failure}")
+    failed_check_count += bool(failures)
+  return failed_check_count
+
+
+def run_benchmarks(case_filter=None, repeats=BENCHMARK_REPEATS):
+  results = {}
+  for case_name, case_function in benchmark_cases.items():
+    if case_filter and case_filter not in case_name:
+      continue
+    random.seed(0)
+    # The fastest repeat is the least disturbed by the rest of the machine
+    results[case_name] = min(case_function() for _ in range(repeats))
+    print(f"{case_name:<32} {results[case_name] * 1e6:12.2f} us")
+  return results
+
+
+def find_regressions(results, baseline, threshold):
+  regressions = []
+  for case_name, seconds in results.items():
+    if case_name in baseline and seconds > baseline[case_name] * threshold:
+      regressions.append((case_name, baseline[case_name], seconds))
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark the game's hot paths headlessly, against a stored baseline.")
+  parser.add_argument("--baseline", default=BENCHMARK_BASELINE_PATH, help="JSON file of baseline timings")
+  parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+  parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="fail when a case is slower than baseline * threshold")
+  parser.add_argument("--repeats", type=int, default=BENCHMARK_REPEATS)
+  parser.add_argument("--filter", default=None, help="only run cases whose name contains this string")
+  args = parser.parse_args()
+
+  if run_behaviour_checks(args.filter):
+    return 1
+  results = run_benchmarks(args.filter, args.repeats)
+
+  if args.save_baseline or not os.path.exists(args.baseline):
+    baseline = {}
+    if os.path.exists(args.baseline):
+      with open(args.baseline, 'r') as file:
+        baseline = json.load(file)
+    baseline.update(results)
+    with open(args.baseline, 'w') as file:
+      json.dump(baseline, file, indent=2, sort_keys=True)
+    print(f"Saved baseline to {args.baseline}")
+    return 0
+
+  with open(args.baseline, 'r') as file:
+    baseline = json.load(file)
+
+  regressions = find_regressions(results, baseline, args.threshold)
+  for case_name, baseline_seconds, seconds in regressions:
+    print(f"REGRESSION {case_name}: {baseline_seconds * 1e6:.2f} us -> {seconds * 1e6:.2f} us ({seconds / baseline_seconds:.2f}x)")
+
+  if regressions:
+    return 1
+  print(f"No regressions beyond {args.threshold:.2f}x of {args.baseline}")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
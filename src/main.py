@@ -1,8 +1,12 @@
-from main_game.main_game import start_game
-from pose_detection.pose_detection import start_pose_detection
+from pose_detection.camera_capture import CAMERA_CONFIG_PATH
+from pose_detection.landmark_cache_source import start_landmark_cache_replay
+from pose_detection.pose_landmarks import PoseResults
+from pose_detection.pose_publisher import start_pose_subscriber
+import argparse
+import os
 import threading
 
-pose_results = None, []
+pose_results = PoseResults(None, [])
 
 
 def set_pose_results_callback(new_pose_results):
@@ -15,11 +19,52 @@ def get_pose_results_callback():
   return pose_results
 
 
+def parse_args():
+  parser = argparse.ArgumentParser(description="Reflect Upon Your Actions")
+  parser.add_argument("--pose-cache", default=None, help="replay a .landmarks.npy cache instead of using the webcam")
+  parser.add_argument("--pose-cache-video", default=None, help="video to show alongside the replayed landmark cache")
+  parser.add_argument("--fast", action="store_true", help="replay one landmark cache frame per simulation tick rather than in real time")
+  parser.add_argument("--pose-socket", default=None, help="subscribe to a pose publisher's socket instead of opening the webcam")
+  parser.add_argument("--camera-config", default=CAMERA_CONFIG_PATH, help="JSON file of camera capture settings (device, backend, size, FOURCC, fps, buffer size)")
+  parser.add_argument("--record-session", default=None, help="record pose input, seed and level transitions for replay_session.py")
+  parser.add_argument("--seed", type=int, default=None, help="random seed for the recorded session")
+  parser.add_argument("--renderer", choices=["surface", "sdl2"], default=None, help="render backend (default: RENDER_BACKEND from the environment, or surface)")
+  return parser.parse_args()
+
+
 def main():
-  pose_detection_thread = threading.Thread(daemon=True, target=start_pose_detection, args=(set_pose_results_callback,))
+  args = parse_args()
+
+  # The display is opened when main_game.globals is imported, so the backend has to be chosen first
+  if args.renderer:
+    os.environ["RENDER_BACKEND"] = args.renderer
+  from main_game.game_body import are_silhouette_colliders_enabled
+  from main_game.main_game import start_game
+  from main_game.quality_governor import get_pose_inference_scale
+  from main_game.session_recording import SessionRecorder
+
+  simulation_tick_callback = None
+  if args.pose_cache:
+    # In fast mode the replay waits for the game to finish a tick before delivering the next frame
+    frame_requests = threading.Semaphore(0) if args.fast else None
+    simulation_tick_callback = frame_requests.release if args.fast else None
+    pose_thread_target = start_landmark_cache_replay
+    pose_thread_args = (set_pose_results_callback, args.pose_cache, args.pose_cache_video, frame_requests)
+  elif args.pose_socket:
+    pose_thread_target = start_pose_subscriber
+    pose_thread_args = (set_pose_results_callback, args.pose_socket)
+  else:
+    # Only import the live detector (and mediapipe) when the webcam is used
+    from pose_detection.pose_detection import start_pose_detection
+    pose_thread_target = start_pose_detection
+    pose_thread_args = (set_pose_results_callback, get_pose_inference_scale, args.camera_config, are_silhouette_colliders_enabled)
+
+  pose_detection_thread = threading.Thread(daemon=True, target=pose_thread_target, args=pose_thread_args)
   pose_detection_thread.start()
 
-  start_game(get_pose_results_callback)
+  session_recorder = SessionRecorder(args.record_session, args.seed) if args.record_session else None
+
+  start_game(get_pose_results_callback, session_recorder, simulation_tick_callback)
 
 
 if __name__ == "__main__":
@@ -6,10 +6,12 @@ from pymunk import Body, Poly
 
 from main_game.globals import (BALL_ELASTICITY, BALL_FRICTION, BALL_MASS,
                                BALL_RADIUS, DEBUG_MODE, FLAG_WIDTH,
-                               FLAT_POLE_HEIGHT, GAME_BODY_TTL_MAX, WebcamInfo,
-                               level_data, physics_space, render_screen,
-                               screen_height, screen_REL_to_screen_POS_xy,
-                               screen_width)
+                               FLAT_POLE_HEIGHT, GAME_BODY_TTL_MAX,
+                               PHYSICS_TO_SCREEN_SCALE_X, PLAYER_COLOURS,
+                               PHYSICS_TO_SCREEN_SCALE_Y, WebcamInfo,
+                               level_data, physics_POS_to_screen_POS_xy,
+                               physics_space, render_screen, screen_height,
+                               screen_REL_to_screen_POS_xy, screen_width)
 from main_game.webcam_and_pose_info import (FloatRect,
                                             cropped_webcam_REL_to_screen_ABS,
                                             screen_REL_to_screen_ABS,
@@ -19,38 +21,64 @@ from main_game.webcam_and_pose_info import (FloatRect,
 def draw_physics_ball(ball):
   ball_shape, ball_body = ball
 
-  radius = ball_shape.radius
-  position = ball_body.position
+  radius = ball_shape.radius * PHYSICS_TO_SCREEN_SCALE_X
+  position = physics_POS_to_screen_POS_xy(ball_body.position)
 
   pygame.draw.circle(render_screen, "blue", position, radius)
 
 
-def draw_physics_ellipse(position, width, height):
-  pygame.draw.ellipse(render_screen, "blue", pygame.Rect(position[0] - width / 2, position[1] - height / 2, width, height), 1)
+def draw_physics_ellipse(position, width, height, colour="blue"):
+  position = physics_POS_to_screen_POS_xy(position)
+  width, height = width * PHYSICS_TO_SCREEN_SCALE_X, height * PHYSICS_TO_SCREEN_SCALE_Y
+  pygame.draw.ellipse(render_screen, colour, pygame.Rect(position[0] - width / 2, position[1] - height / 2, width, height), 1)
 
 
-def draw_physics_line(line):
+def draw_physics_line(line, colour="black"):
   line_shape, _ = line
 
-  start_position = (line_shape.a.x, line_shape.a.y)
-  end_position = (line_shape.b.x, line_shape.b.y)
+  start_position = physics_POS_to_screen_POS_xy(line_shape.a)
+  end_position = physics_POS_to_screen_POS_xy(line_shape.b)
 
-  pygame.draw.line(render_screen, "black", start_position, end_position)
+  pygame.draw.line(render_screen, colour, start_position, end_position)
 
 
 def draw_physics_flag(flag):
   if flag:
     flag_shape, _ = flag
 
-    position_x, position_y = flag_shape.a
-    rect = pygame.Rect(position_x, position_y - FLAT_POLE_HEIGHT - FLAG_WIDTH, FLAG_WIDTH, FLAG_WIDTH)
+    position_x, position_y = physics_POS_to_screen_POS_xy(flag_shape.a)
+    flag_width = FLAG_WIDTH * PHYSICS_TO_SCREEN_SCALE_X
+    flag_height = FLAG_WIDTH * PHYSICS_TO_SCREEN_SCALE_Y
+    pole_height = FLAT_POLE_HEIGHT * PHYSICS_TO_SCREEN_SCALE_Y
+    rect = pygame.Rect(position_x, position_y - pole_height - flag_height, flag_width, flag_height)
   
     pygame.draw.rect(render_screen, "green", rect)
     pygame.draw.rect(render_screen, "black", rect, width=1)
-    pygame.draw.line(render_screen, "black", (position_x, position_y), (position_x, position_y - FLAG_WIDTH - FLAT_POLE_HEIGHT))
+    pygame.draw.line(render_screen, "black", (position_x, position_y), (position_x, position_y - flag_height - pole_height))
+
+
+# (level, background images loaded ahead of that level)
+prefetched_background_images = None, None
+hud_surface = None
+
+
+def prefetch_background_images(level):
+  global prefetched_background_images
+  prefetched_background_images = level, load_and_scale_background_images(level)
+
+
+def get_prefetched_level():
+  return prefetched_background_images[0]
 
 
 def load_and_scale_background_images(level):
+  global prefetched_background_images
+
+  prefetched_level, prefetched_images = prefetched_background_images
+  if prefetched_level == level:
+    prefetched_background_images = None, None
+    return prefetched_images
+
   images = []
   for image_info in level_data[level]["background_images"]:
     image_path = image_info["image"]
@@ -81,11 +109,15 @@ def draw_balls(balls):
     for ball in balls:
         draw_physics_ball(ball)
 
-def draw_heads(game_heads):
+def get_player_colour(current_level, player_id):
+    player_colours = level_data[current_level].get("player_colours", PLAYER_COLOURS)
+    return player_colours[player_id % len(player_colours)]
+
+def draw_heads(current_level, game_heads):
     for head in game_heads:
-        phys_obj, new_head_pos, new_head_width, new_head_height, ttl = head
+        phys_obj, new_head_pos, new_head_width, new_head_height, ttl, player_id = head
         # poly_obj, body_obj = head_line # Assuming the physics_object contains position and dimensions
-        draw_physics_ellipse(new_head_pos, new_head_width, new_head_height)
+        draw_physics_ellipse(new_head_pos, new_head_width, new_head_height, get_player_colour(current_level, player_id))
 
 def draw_rectangles(webcam_info: WebcamInfo, grids):
   if not (webcam_info.webcam_surface_rescaled is None):
@@ -117,11 +149,20 @@ def draw_webcam(current_level, wc: WebcamInfo, render_font):
       pygame.draw.rect(render_screen, "green", cropped_area.move(wc.target_rect_ABS.topleft), 3)
 
 
+def update_hud(hud_text, render_font):
+  global hud_surface
+  hud_surface = render_font.render(hud_text, True, (0, 0, 0))
+
+
+def get_hud_surface():
+  return hud_surface
+
+
 def lvl_to_title(current_level):
   level_int = current_level[6:]
   return f"Level: {level_int}"
 
-def draw_game(bg_images, current_level, balls, flag, webcam_info: WebcamInfo, level_lines, game_limbs, game_heads, grids, text, screen_width, screen_height, render_font):
+def draw_game(bg_images, current_level, balls, flag, webcam_info: WebcamInfo, level_lines, game_limbs, game_heads, silhouette_lines, grids, text, screen_width, screen_height, render_font):
   draw_background(bg_images)
 
   if not (webcam_info.raw_image is None):
@@ -135,11 +176,14 @@ def draw_game(bg_images, current_level, balls, flag, webcam_info: WebcamInfo, le
   for line in level_lines:
     draw_physics_line(line)
 
-  for line, ttl in game_limbs:
+  for line, ttl, player_id in game_limbs:
     if ttl == GAME_BODY_TTL_MAX:
-      draw_physics_line(line)
+      draw_physics_line(line, get_player_colour(current_level, player_id))
   
-  draw_heads(game_heads)
+  draw_heads(current_level, game_heads)
+
+  for line in silhouette_lines:
+    draw_physics_line(line)
 
   if not (webcam_info.webcam_surface_rescaled is None):
     draw_rectangles(webcam_info, grids)
@@ -147,6 +191,9 @@ def draw_game(bg_images, current_level, balls, flag, webcam_info: WebcamInfo, le
   # Print level number text
   render_screen.blit(render_font.render(lvl_to_title(current_level), True, (0, 0, 0)), (0, 0))
 
+  if hud_surface:
+    render_screen.blit(hud_surface, (0, screen_height - hud_surface.get_height()))
+
   # Print instruction text
   if not (webcam_info.webcam_rect_rescaled_ABS is None):
     render_screen.blit(render_font.render(text, True, (0, 0, 0)), (webcam_info.target_rect_ABS.left + 20, webcam_info.target_rect_ABS.bottom + 20))
\ No newline at end of file
@@ -1,27 +1,60 @@
+import functools
 from typing import List, Tuple
 
+import numpy as np
 from pymunk import Body, Poly, Segment
 
 from main_game.globals import (BALL_ELASTICITY, BALL_FRICTION, BALL_MASS,
                                BALL_RADIUS, FLAG_WIDTH, FLAT_POLE_HEIGHT,
-                               GAME_BODY_TTL_MAX, WebcamInfo, level_data,
+                               GAME_BODY_TTL_MAX, PHYSICS_TIMESTEP,
+                               SILHOUETTE_REBUILD_TOLERANCE,
+                               SWEPT_LIMB_MAX_SLICES, SWEPT_LIMB_MAX_SPEED,
+                               SWEPT_LIMB_MIN_DISTANCE, SWEPT_LIMBS, WebcamInfo, level_data,
                                physics_space, render_clock, render_font,
-                               screen_height, screen_REL_to_screen_POS_xy,
+                               screen_height, screen_REL_to_physics_POS_xy,
                                screen_width)
-from main_game.physics_objects import add_physics_ellipse, add_physics_line
+from main_game.physics_budget import wake_bodies_near
+from main_game.physics_objects import (add_physics_ellipse, add_physics_line,
+                                       add_physics_sweep)
+from main_game.quality_governor import get_quality_setting
 from main_game.webcam_and_pose_info import (cropped_webcam_REL_to_screen_ABS,
+                                            get_players_head_info,
                                             screen_REL_to_screen_ABS)
-from utils.clip_lines_within_box import line_clip
+from pose_detection.pose_landmarks import connected_landmarks
+from utils.clip_lines_within_box import clip_line_array, line_clip
 from utils.scale_and_translate_ellipse import scale_and_translate_ellipse
-from utils.scale_and_translate_lines import scale_and_translate_lines
+from utils.scale_and_translate_lines import (scale_and_translate_line_array,
+                                             scale_and_translate_lines)
 
 
-def update_game_body(game_limbs, game_heads, current_level, pose_lines, grids, allow_head, head_width, head_height, head_pos, level_data):
+# Limbs that become colliders when a level does not set "allowed_limb_connections"
+DEFAULT_ALLOWED_LIMB_CONNECTIONS = [
+    [8, 6], [6, 5], [5, 4], [4, 0], [0, 1], [1, 2],
+    [2, 3], [3, 7], [10, 9], [18, 20], [20, 16], [16, 18],
+    [16, 22], [16, 14], [14, 12], [19, 17], [17, 15], [15, 19],
+    [15, 21], [15, 13], [13, 11], [12, 11], [12, 24], [11, 23],
+    [24, 23], [24, 26], [26, 28], [28, 32], [32, 30], [30, 28],
+    [23, 25], [25, 27], [27, 29], [29, 31], [31, 27]]
+
+# (level, player ID) -> the player's limbs in the last pose, as (grids x limbs lines clipped to their grid,
+# grids x limbs mask of the lines inside their grid, grids x limbs unclipped lines), all in physics coordinates, which
+# swept limbs start from
+previous_limb_lines = {}
+# Whether the current level turns the player's outline into colliders, so the pose thread only extracts it when used
+is_silhouette_level = False
+
+
+def update_game_body(game_limbs, game_heads, current_level, player_points, player_ids, grids, allow_head, level_data):
     game_limbs = remove_dead_game_limbs(game_limbs)
-    game_limbs = add_game_limbs(level_data, current_level, pose_lines, grids, game_limbs)
+    game_limbs = add_game_limbs(level_data, current_level, player_points, player_ids, grids, game_limbs,
+                                level_data[current_level].get("swept_limbs", SWEPT_LIMBS))
 
     game_heads = remove_dead_game_heads(game_heads)
-    game_heads = add_heads(allow_head, head_width, head_height, head_pos, grids, game_heads)
+    game_heads = add_heads(allow_head, level_data, current_level, player_points, player_ids, grids, game_heads)
+
+    # Limbs and heads are placed rather than moved into balls, which does not wake a ball that has gone to sleep
+    wake_bodies_near([line_shape for (line_shape, _), ttl, _ in game_limbs if ttl == GAME_BODY_TTL_MAX] +
+                     [head_shape for (head_shape, _), _, _, _, ttl, _ in game_heads if ttl == GAME_BODY_TTL_MAX])
 
     return game_limbs, game_heads
 
@@ -29,11 +62,11 @@ def remove_dead_game_limbs(game_limbs):
 
   new_game_limbs = []
 
-  for line, ttl in game_limbs:
+  for line, ttl, player_id in game_limbs:
     if ttl <= 0:
       physics_space.remove(*line)
     else:
-      new_game_limbs.append((line, ttl - 1))
+      new_game_limbs.append((line, ttl - 1, player_id))
 
   return new_game_limbs
 
@@ -42,62 +75,259 @@ def remove_dead_game_heads(game_heads):
 
   new_game_heads = []
 
-  for head, new_head_pos, new_head_width, new_head_height, ttl in game_heads:
+  for head, new_head_pos, new_head_width, new_head_height, ttl, player_id in game_heads:
     if ttl <= 0:
       physics_space.remove(*head)
     else:
-      new_game_heads.append((head, new_head_pos, new_head_width, new_head_height, ttl - 1))
+      new_game_heads.append((head, new_head_pos, new_head_width, new_head_height, ttl - 1, player_id))
 
   return new_game_heads
 
 
-def add_game_limbs(level_data, current_level, pose_lines, grids, game_limbs: List[Tuple[Tuple[Segment, Body], int]]):
-    allowed_connections = level_data[current_level].get("allowed_limb_connections",
-        [[8, 6], [6, 5], [5, 4], [4, 0], [0, 1], [1, 2],
-          [2, 3], [3, 7], [10, 9], [18, 20], [20, 16], [16, 18],
-          [16, 22], [16, 14], [14, 12], [19, 17], [17, 15], [15, 19],
-          [15, 21], [15, 13], [13, 11], [12, 11], [12, 24], [11, 23],
-          [24, 23], [24, 26], [26, 28], [28, 32], [32, 30], [30, 28],
-          [23, 25], [25, 27], [27, 29], [29, 31], [31, 27]])
+def get_player_grid_mask(level_info, player_ids, grid_count):
+    # players x grids, True where the player's body is mapped into that grid. "player_grids" in levels.json lists
+    # the grid indices of each player ID, and players without an entry use every grid.
+    player_grids = level_info.get("player_grids")
+    player_grid_mask = np.ones((len(player_ids), grid_count), dtype=bool)
+    if player_grids is not None:
+      for player_index, player_id in enumerate(player_ids):
+        if player_id < len(player_grids):
+          player_grid_mask[player_index] = np.isin(np.arange(grid_count), player_grids[player_id])
+    return player_grid_mask
 
-    # physics_space.debug_draw(draw_options)
-    for line in pose_lines:
-      (start_position_x, start_position_y, connection1), (end_position_x, end_position_y, connection2) = line
-      if ([connection1, connection2] in allowed_connections) or ([connection2, connection1] in allowed_connections):
-        for grid in grids:
-          game_position, webcam_position, colour = grid
 
-          left, top, width, height = webcam_position
-          game_left, game_top, game_width, game_height = game_position
+@functools.lru_cache
+def get_limb_connections(current_level):
+    # The pose connections that become colliders on this level, as [landmark index, landmark index] pairs
+    allowed_connections = level_data[current_level].get("allowed_limb_connections", DEFAULT_ALLOWED_LIMB_CONNECTIONS)
+    return [[connection1, connection2] for connection1, connection2 in connected_landmarks
+            if [connection1, connection2] in allowed_connections or [connection2, connection1] in allowed_connections]
+
+
+def reset_limb_sweeps():
+    # Called when a new game starts, so the first pose is not swept from the last game's
+    previous_limb_lines.clear()
+
+
+def get_limb_lines(player_points, limb_connections):
+    # Every player's limbs as one (players * limbs) x (start, end) x (x, y) array, mirrored like the webcam preview
+    limb_lines = np.array(player_points, dtype=np.float64)[:, limb_connections].reshape(-1, 2, 2)
+    limb_lines[:, :, 0] = 1 - limb_lines[:, :, 0]
+    return limb_lines
+
+
+def get_grid_limb_lines(level_info, limb_lines, line_players, player_ids, grids):
+    # Repeats the limbs for every grid, so all limbs are clipped and mapped into all grids in one pass, each with its
+    # grid's boxes. Returns the lines in screen REL coordinates, which of them are inside their grid, and the lines
+    # mapped into their grid without clipping.
+    grid_count = len(grids)
+    webcam_boxes = np.array([webcam_position for _, webcam_position, _ in grids], dtype=np.float64).repeat(len(limb_lines), axis=0)
+    game_boxes = np.array([game_position for game_position, _, _ in grids], dtype=np.float64).repeat(len(limb_lines), axis=0)
+    webcam_box = ((webcam_boxes[:, 0], webcam_boxes[:, 1]), (webcam_boxes[:, 0] + webcam_boxes[:, 2], webcam_boxes[:, 1] + webcam_boxes[:, 3]))
+    game_box = ((game_boxes[:, 0], game_boxes[:, 1]), (game_boxes[:, 0] + game_boxes[:, 2], game_boxes[:, 1] + game_boxes[:, 3]))
+
+    grid_limb_lines = np.tile(limb_lines, (grid_count, 1, 1))
+    clipped_lines, inside = clip_line_array(grid_limb_lines, webcam_box)
+    inside &= get_player_grid_mask(level_info, player_ids, grid_count)[np.tile(line_players, grid_count), np.arange(grid_count).repeat(len(limb_lines))]
+    return scale_and_translate_line_array(clipped_lines, webcam_box, game_box), inside, scale_and_translate_line_array(grid_limb_lines, webcam_box, game_box)
+
+
+def get_limb_order(line_indices, limb_count):
+    # Colliders are added limb by limb, then grid by grid, so the physics space sees them in a stable order
+    return line_indices[np.argsort(line_indices % limb_count, kind="stable")]
+
 
-          clipped_line = line_clip(((1 - start_position_x, start_position_y), (1 - end_position_x, end_position_y)), ((left, top), (left + width, top + height)))
-          if clipped_line:
-            start_pos, end_pos = scale_and_translate_lines([clipped_line], ((left, top), (left + width, top + height)),
-                                                           ((game_left, game_top), (game_left + game_width, game_top + game_height)))[0]
+def add_game_limbs(level_data, current_level, player_points, player_ids, grids, game_limbs: List[Tuple[Tuple[Segment, Body], int, int]], swept_limbs=False):
+    limb_connections = get_limb_connections(current_level)
+    if len(player_points) == 0 or not limb_connections or not grids:
+      previous_limb_lines.clear()
+      return game_limbs
+
+    limb_lines = get_limb_lines(player_points, limb_connections)
+    line_players = np.repeat(np.arange(len(player_ids)), len(limb_connections))
+    game_lines, inside, unclipped_game_lines = get_grid_limb_lines(level_data[current_level], limb_lines, line_players, player_ids, grids)
+
+    line_indices = get_limb_order(np.flatnonzero(inside), len(limb_lines))
+    for line_index, (start_pos, end_pos) in zip(line_indices.tolist(), game_lines[line_indices].tolist()):
+      line = add_physics_line(tuple(start_pos), tuple(end_pos))
+      game_limbs.append((line, GAME_BODY_TTL_MAX, player_ids[line_players[line_index % len(limb_lines)]]))
+
+    if swept_limbs:
+      add_limb_sweeps(current_level, player_ids, grids, len(limb_connections), game_lines, inside, unclipped_game_lines)
+    else:
+      previous_limb_lines.clear()
 
-            line = add_physics_line(start_pos, end_pos)
-            game_limbs.append((line, GAME_BODY_TTL_MAX))
-    
     return game_limbs
 
 
-def add_heads(allow_head, head_width, head_height, head_pos, grids, game_heads):
-    if allow_head and head_width and head_height and head_pos:
+def to_physics_lines(lines):
+    return np.stack(screen_REL_to_physics_POS_xy((lines[..., 0], lines[..., 1])), axis=-1)
+
+
+def add_limb_sweeps(current_level, player_ids, grids, limb_count, game_lines, inside, unclipped_game_lines):
+    # Limb segments jump from pose to pose, so a fast swing passes straight over a ball, however many physics substeps
+    # are run. Sweeps cover the area between each limb's previous and new position for one physics tick, and move
+    # at the limb's speed, so a ball it passed over is knocked along in a single step.
+    grid_count = len(grids)
+    lines_physics = to_physics_lines(game_lines).reshape(grid_count, len(player_ids), limb_count, 2, 2)
+    unclipped_lines_physics = to_physics_lines(unclipped_game_lines).reshape(grid_count, len(player_ids), limb_count, 2, 2)
+    inside = inside.reshape(grid_count, len(player_ids), limb_count)
+
+    # Players who were not in the last pose on this level have nothing to sweep from
+    missing_limb_lines = np.full((grid_count, limb_count, 2, 2), np.nan), np.zeros((grid_count, limb_count), dtype=bool), np.full((grid_count, limb_count, 2, 2), np.nan)
+    previous_lines_physics, previous_inside, previous_unclipped_lines_physics = (np.stack(limb_arrays, axis=1) for limb_arrays in
+                                                                                 zip(*[previous_limb_lines.get((current_level, player_id), missing_limb_lines) for player_id in player_ids]))
+
+    previous_limb_lines.clear()
+    for player_index, player_id in enumerate(player_ids):
+      previous_limb_lines[(current_level, player_id)] = lines_physics[:, player_index], inside[:, player_index], unclipped_lines_physics[:, player_index]
+
+    # A limb that was outside its grid in the last pose entered it from the edge it crossed, so it is swept from its
+    # last position clamped into the grid
+    game_boxes = to_physics_lines(np.array([((left, top), (left + width, top + height)) for (left, top, width, height), _, _ in grids], dtype=np.float64))
+    clamped_lines_physics = np.clip(previous_unclipped_lines_physics, game_boxes[:, np.newaxis, np.newaxis, np.newaxis, 0], game_boxes[:, np.newaxis, np.newaxis, np.newaxis, 1])
+    previous_lines_physics = np.where(previous_inside[..., np.newaxis, np.newaxis], previous_lines_physics, clamped_lines_physics)
+
+    lines_physics, inside = lines_physics.reshape(-1, 2, 2), inside.reshape(-1)
+    previous_lines_physics = previous_lines_physics.reshape(-1, 2, 2)
+    unclipped_movement = (unclipped_lines_physics - previous_unclipped_lines_physics).reshape(-1, 2, 2)
+
+    # Limbs that moved less than a ball radius cannot have jumped over a ball
+    movement = lines_physics - previous_lines_physics
+    distances = np.linalg.norm(movement, axis=2).max(axis=1)
+    is_swept = inside & ~np.isnan(distances)
+    is_swept[is_swept] = distances[is_swept] > SWEPT_LIMB_MIN_DISTANCE
+
+    # Clipping moves the ends of a limb along its grid's edges, so the speed is taken from the unclipped limb
+    velocities = unclipped_movement.mean(axis=1) / PHYSICS_TIMESTEP
+    speeds = np.linalg.norm(velocities, axis=1, keepdims=True)
+    velocities *= np.minimum(1, SWEPT_LIMB_MAX_SPEED / np.maximum(speeds, 1e-9))
+
+    # A ball is pushed out of a sweep by the nearest edge, so one sweep over the whole area pushes the balls near a
+    # long limb's ends out sideways. The area is cut along the movement into slices no deeper than a ball, all moving
+    # at the limb's speed, so every ball the limb passed over is nearest a leading edge.
+    line_indices = get_limb_order(np.flatnonzero(is_swept), len(player_ids) * limb_count)
+    slice_counts = np.clip(np.ceil(distances[line_indices] / (2 * BALL_RADIUS)), 1, SWEPT_LIMB_MAX_SLICES).astype(int)
+    slice_line_indices = line_indices.repeat(slice_counts)
+    slice_starts = (np.arange(slice_counts.sum()) - (slice_counts.cumsum() - slice_counts).repeat(slice_counts)) / slice_counts.repeat(slice_counts)
+    slice_ends = slice_starts + 1 / slice_counts.repeat(slice_counts)
+    slice_vertices = np.concatenate([
+      previous_lines_physics[slice_line_indices] + movement[slice_line_indices] * slice_starts[:, np.newaxis, np.newaxis],
+      previous_lines_physics[slice_line_indices] + movement[slice_line_indices] * slice_ends[:, np.newaxis, np.newaxis]], axis=1)
+    for vertices, velocity in zip(slice_vertices.tolist(), velocities[slice_line_indices].tolist()):
+      add_physics_sweep(vertices, tuple(velocity))
+
+
+def get_grid_line(start_position, end_position, grid):
+    # Mirrors a line in webcam REL coordinates, clips it to the grid's webcam box and maps it into the grid's game box
+    game_position, webcam_position, colour = grid
+
+    left, top, width, height = webcam_position
+    game_left, game_top, game_width, game_height = game_position
+
+    (start_position_x, start_position_y), (end_position_x, end_position_y) = start_position, end_position
+
+    clipped_line = line_clip(((1 - start_position_x, start_position_y), (1 - end_position_x, end_position_y)), ((left, top), (left + width, top + height)))
+    if clipped_line:
+      return scale_and_translate_lines([clipped_line], ((left, top), (left + width, top + height)),
+                                       ((game_left, game_top), (game_left + game_width, game_top + game_height)))[0]
+    return None
+
+
+def get_distances_to_contour(points, contour):
+    # Distance from each point to the nearest edge of a closed contour
+    starts = np.asarray(contour, dtype=np.float64)
+    edges = np.roll(starts, -1, axis=0) - starts
+    offsets = np.asarray(points, dtype=np.float64)[:, np.newaxis] - starts
+    edge_lengths = np.maximum((edges ** 2).sum(axis=1), 1e-12)
+    along_edge = np.clip((offsets * edges).sum(axis=2) / edge_lengths, 0, 1)
+    return np.linalg.norm(offsets - along_edge[..., np.newaxis] * edges, axis=2).min(axis=1)
+
+
+def has_silhouette_changed(built_contours, silhouette_contours):
+    # Contours are compared as shapes, by the symmetric Hausdorff distance between them, as the vertices the pose
+    # thread picks along an outline change from frame to frame even when the outline does not
+    if len(built_contours) != len(silhouette_contours):
+      return True
+    for built_contour, silhouette_contour in zip(built_contours, silhouette_contours):
+      if (get_distances_to_contour(built_contour, silhouette_contour).max() > SILHOUETTE_REBUILD_TOLERANCE or
+          get_distances_to_contour(silhouette_contour, built_contour).max() > SILHOUETTE_REBUILD_TOLERANCE):
+        return True
+    return False
+
+
+def set_level_silhouette_colliders(level_info):
+    global is_silhouette_level
+    is_silhouette_level = level_info.get("silhouette_colliders", False)
+
+
+def are_silhouette_colliders_enabled():
+    # Read by the pose detection thread
+    return is_silhouette_level
+
+
+def remove_silhouette_colliders(game_silhouette):
+    # The colliders are clipped to the grids of the level they were built in, so they go with a level change
+    for line in game_silhouette[1]:
+      physics_space.remove(*line)
+    return [], []
+
+
+def update_silhouette_colliders(game_silhouette, current_level, silhouette_contours, grids):
+    # game_silhouette is (the contours the colliders were built from, the colliders)
+    built_contours, silhouette_lines = game_silhouette
+
+    if not level_data[current_level].get("silhouette_colliders", False):
+      silhouette_contours = []
+
+    # Rebuilding costs a space add/remove per edge, so small movements of the outline are ignored
+    if not has_silhouette_changed(built_contours, silhouette_contours):
+      return game_silhouette
+
+    for line in silhouette_lines:
+      physics_space.remove(*line)
+
+    silhouette_lines = []
+    for contour in silhouette_contours:
+      for start_position, end_position in zip(contour, contour[1:] + contour[:1]):
         for grid in grids:
-            game_position, webcam_position, _ = grid
-            left, top, width, height = webcam_position
-            game_left, game_top, game_width, game_height = game_position
-
-            in_box = head_pos[0] > left and head_pos[0] < left + width and head_pos[1] > top and head_pos[1] < top + height
-            if in_box:
-                new_head_pos, new_head_width, new_head_height = scale_and_translate_ellipse(
-                    (head_pos, head_width, head_height),
-                    ((left, top), (left + width, top + height)),
-                    ((game_left, game_top), (game_left + game_width, game_top + game_height))
-                )
-                new_head_pos = screen_REL_to_screen_POS_xy(new_head_pos)
-                new_head_width, new_head_height = screen_REL_to_screen_POS_xy((new_head_width, new_head_height))
-
-                # Add head to the physics space and keep the reference for drawing
-                game_heads.append((add_physics_ellipse(new_head_pos, new_head_width, new_head_height), new_head_pos, new_head_width, new_head_height, GAME_BODY_TTL_MAX))
-    return game_heads
\ No newline at end of file
+          grid_line = get_grid_line(start_position, end_position, grid)
+          if grid_line:
+            silhouette_lines.append(add_physics_line(*grid_line))
+    wake_bodies_near([line_shape for line_shape, _ in silhouette_lines])
+
+    return silhouette_contours, silhouette_lines
+
+
+def add_heads(allow_head, level_data, current_level, player_points, player_ids, grids, game_heads):
+    if not allow_head or len(player_points) == 0:
+        return game_heads
+
+    head_width, head_height, head_pos = get_players_head_info(player_points)
+    has_head = (head_width > 0) & (head_height > 0)
+    player_grid_mask = get_player_grid_mask(level_data[current_level], player_ids, len(grids))
+
+    for grid_index, grid in enumerate(grids):
+        game_position, webcam_position, _ = grid
+        left, top, width, height = webcam_position
+        game_left, game_top, game_width, game_height = game_position
+
+        in_box = has_head & player_grid_mask[:, grid_index] & (head_pos[:, 0] > left) & (head_pos[:, 0] < left + width) & (head_pos[:, 1] > top) & (head_pos[:, 1] < top + height)
+        if not in_box.any():
+            continue
+
+        # scale_and_translate_ellipse works on arrays of centres and sizes as well as single ellipses
+        (new_head_x, new_head_y), new_head_width, new_head_height = scale_and_translate_ellipse(
+            ((head_pos[in_box, 0], head_pos[in_box, 1]), head_width[in_box], head_height[in_box]),
+            ((left, top), (left + width, top + height)),
+            ((game_left, game_top), (game_left + game_width, game_top + game_height))
+        )
+        new_head_x, new_head_y = screen_REL_to_physics_POS_xy((new_head_x, new_head_y))
+        new_head_width, new_head_height = screen_REL_to_physics_POS_xy((new_head_width, new_head_height))
+
+        for player_index, head_x, head_y, head_width_physics, head_height_physics in zip(np.flatnonzero(in_box).tolist(), new_head_x.tolist(), new_head_y.tolist(),
+                                                                                          new_head_width.tolist(), new_head_height.tolist()):
+            # Add head to the physics space and keep the reference for drawing
+            head = add_physics_ellipse((head_x, head_y), head_width_physics, head_height_physics, get_quality_setting("ellipse_segments"))
+            game_heads.append((head, (head_x, head_y), head_width_physics, head_height_physics, GAME_BODY_TTL_MAX, player_ids[player_index]))
+    return game_heads
@@ -1,40 +1,163 @@
 import dataclasses
-import json
+import os
 
 import pygame
 import pymunk
 
+from main_game.level_catalogue import LevelCatalogue
+
+# --- Initialise PyGame (Rendering) ---
+
+# Everything is drawn at RENDER_RESOLUTION, then upscaled to the fullscreen display in a single scale blit
+# (or by SDL when USE_PYGAME_SCALED is set). None draws straight to the display at its native resolution.
+RENDER_RESOLUTION = (1280, 720)
+USE_PYGAME_SCALED = False
+
+# "surface" draws everything with pygame.draw and blits onto render_screen. "sdl2" draws through an SDL2 Renderer
+# (pygame._sdl2.video), keeping static level layers and the webcam preview in textures. Chosen at startup with the
+# RENDER_BACKEND environment variable. SDL_RENDER_DRIVER=software runs the sdl2 backend without a GPU.
+RENDER_BACKEND = os.environ.get("RENDER_BACKEND", "surface")
+
 pygame.init()
-render_screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+if RENDER_BACKEND == "sdl2":
+  from pygame._sdl2.video import Renderer, Window
+
+  display_screen = None
+  sdl2_window = Window(size=RENDER_RESOLUTION or (1280, 720), fullscreen_desktop=True)
+  sdl2_renderer = Renderer(sdl2_window)
+  # Only used to draw layers that are then uploaded as textures, so it never needs converting to the display format
+  render_screen = pygame.Surface(RENDER_RESOLUTION or sdl2_window.size)
+  # The renderer scales its logical size to the window, replacing the scale blit in present_frame
+  sdl2_renderer.logical_size = render_screen.get_size()
+else:
+  if RENDER_RESOLUTION and USE_PYGAME_SCALED:
+    display_screen = pygame.display.set_mode(RENDER_RESOLUTION, pygame.FULLSCREEN | pygame.SCALED)
+  else:
+    display_screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+
+  if RENDER_RESOLUTION and display_screen.get_size() != tuple(RENDER_RESOLUTION):
+    render_screen = pygame.Surface(RENDER_RESOLUTION).convert(display_screen)
+  else:
+    render_screen = display_screen
 
 render_clock = pygame.time.Clock()
 
 render_font = pygame.font.SysFont(None, 48)
-screen_width, screen_height = pygame.display.get_surface().get_size()
+screen_width, screen_height = render_screen.get_size()
 
 # --- Initialise PyMunk (Physics Engine) ---
 
+# Physics has its own coordinate space, independent of the render resolution, so gameplay is the same on every display
+PHYSICS_WIDTH = 1920
+PHYSICS_HEIGHT = 1080
+PHYSICS_TO_SCREEN_SCALE_X = screen_width / PHYSICS_WIDTH
+PHYSICS_TO_SCREEN_SCALE_Y = screen_height / PHYSICS_HEIGHT
+
 physics_space = pymunk.Space()
 physics_space.gravity = (0.0, 900.0)
+PHYSICS_TIMESTEP = 1 / 60.0
+# Physics ticks run at 1 / PHYSICS_TIMESTEP per second of wall time, however fast frames are drawn. After a stall,
+# at most this many ticks catch up on a single frame.
+MAX_PHYSICS_TICKS_PER_FRAME = 4
 # physics_space.collision_slop = 0.5
+# Solver iterations per step, which a level can change with "physics_iterations" in levels.json
+PHYSICS_ITERATIONS = 10
+# A body moving slower than PHYSICS_IDLE_SPEED for PHYSICS_SLEEP_TIME seconds (or a level's "physics_sleep_time") is
+# put to sleep until something touches it. Balls within PHYSICS_WAKE_DISTANCE of a new limb or head are woken.
+PHYSICS_SLEEP_TIME = 0.5
+PHYSICS_IDLE_SPEED = 15.0
 
 # --- Add Objects To Scene ---
 
 BALL_MASS = 1
-BALL_RADIUS = 0.007 * screen_width
+BALL_RADIUS = 0.007 * PHYSICS_WIDTH
 BALL_ELASTICITY = 1.0
 BALL_FRICTION = 1.0
+# Balls and level lines are told apart from player colliders and the flag by their collision type
+BALL_COLLISION_TYPE = 1
+LEVEL_LINE_COLLISION_TYPE = 2
 
-FLAG_WIDTH = 0.02 * screen_width
-FLAT_POLE_HEIGHT = 0.02 * screen_width
+FLAG_WIDTH = 0.02 * PHYSICS_WIDTH
+FLAT_POLE_HEIGHT = 0.02 * PHYSICS_WIDTH
 
 GAME_BODY_TTL_MAX = 1
+# Levels with "swept_limbs" in levels.json (or all levels, if SWEPT_LIMBS is set) also get a collider over the area
+# each limb moved through since the last pose, for one physics tick, so a fast swing hits balls instead of jumping past
+SWEPT_LIMBS = False
+SWEPT_LIMB_MIN_DISTANCE = BALL_RADIUS
+# A ball hit by a sweep should move at most its own width per tick, so it does not tunnel through level lines in turn
+SWEPT_LIMB_MAX_SPEED = 2 * BALL_RADIUS / PHYSICS_TIMESTEP
+# Sweeps are cut into slices a ball deep, up to this many per limb, beyond which the slices of a tracking jump get deeper
+SWEPT_LIMB_MAX_SLICES = 16
+PHYSICS_WAKE_DISTANCE = 2 * BALL_RADIUS
+# Above the quality level's "max_live_balls", the oldest balls at rest on level lines or other balls are evicted. A ball
+# is at rest when asleep, or slower than this.
+PHYSICS_RESTING_SPEED = 4 * PHYSICS_IDLE_SPEED
+# Limbs and heads are drawn in the colour of their player ID, which a level can override with "player_colours"
+PLAYER_COLOURS = ["black", "red", "blue", "darkgreen"]
+# Silhouette colliders are rebuilt when any point of the outline moves further than this from the old outline, or back
+# (the Hausdorff distance), in webcam REL coordinates
+SILHOUETTE_REBUILD_TOLERANCE = 0.01
 WEBCAM_SIZE_SCALAR = 1/4
 
 DEBUG_MODE = False
 
-with open('main_game/levels.json', 'r') as file:
-  level_data = json.load(file)
+# --- Memory Tracking (tracemalloc) ---
+
+MEMORY_TRACKING_MODE = False
+MEMORY_TRACKING_FRAMES = 25
+MEMORY_REPORT_INTERVAL = 600
+MEMORY_SNAPSHOT_INTERVAL = 3600
+MEMORY_SNAPSHOT_DIR = "memory_snapshots"
+
+# --- Adaptive Quality ---
+
+# Ordered from highest to lowest quality. The governor steps between these to hold TARGET_FPS,
+# and a level can pin one with "quality_level" (a name or index) in levels.json.
+QUALITY_LEVELS = [
+  {"name": "high",   "webcam_preview_step": 1, "webcam_update_interval": 1, "ellipse_segments": 50, "physics_substeps": 2, "max_live_balls": 200, "pose_inference_scale": 1.0},
+  {"name": "medium", "webcam_preview_step": 1, "webcam_update_interval": 1, "ellipse_segments": 50, "physics_substeps": 1, "max_live_balls": 120, "pose_inference_scale": 1.0},
+  {"name": "low",    "webcam_preview_step": 2, "webcam_update_interval": 2, "ellipse_segments": 24, "physics_substeps": 1, "max_live_balls": 60,  "pose_inference_scale": 0.75},
+  {"name": "lowest", "webcam_preview_step": 3, "webcam_update_interval": 3, "ellipse_segments": 12, "physics_substeps": 1, "max_live_balls": 30,  "pose_inference_scale": 0.5},
+]
+DEFAULT_QUALITY_LEVEL = 1
+TARGET_FPS = 60
+QUALITY_WINDOW_FRAMES = 60
+QUALITY_DOWNGRADE_WINDOWS = 2
+QUALITY_UPGRADE_WINDOWS = 5
+QUALITY_DOWNGRADE_LOAD = 0.9
+QUALITY_UPGRADE_LOAD = 0.5
+
+# --- Stage Scheduling ---
+
+# Seconds each main loop stage is expected to take. Runs over budget are counted in the schedule stats.
+STAGE_BUDGETS = {"events": 0.001, "pose": 0.003, "simulation": 0.004, "hud": 0.001, "draw": 0.006}
+HUD_RATE = 4
+SHOW_STATS_HUD = False
+# Idle tasks run in whatever is left of the frame after the stages
+SCHEDULE_STATS_INTERVAL = 10.0
+SCHEDULE_STATS_PATH = None
+GC_IDLE_INTERVAL = 1.0
+GC_MAX_DEFER = 5.0
+GC_FULL_INTERVAL = 30.0
+
+# --- Session Recording ---
+
+SESSION_CHECKSUM_INTERVAL = 60
+
+# --- Level Simulation ---
+
+SIMULATION_MAX_FRAMES = 60 * 60
+
+# --- Levels ---
+
+# Either a single levels.json style file, or a directory with an index.json and a file per level (see
+# main_game/level_catalogue.py). Chosen at startup with the LEVELS_PATH environment variable.
+LEVELS_PATH = os.environ.get("LEVELS_PATH", "main_game/levels.json")
+# Levels kept parsed when they are read from a directory
+LEVEL_CACHE_SIZE = 8
+
+level_data = LevelCatalogue(LEVELS_PATH, LEVEL_CACHE_SIZE)
 
 @dataclasses.dataclass
 class WebcamInfo:
@@ -46,4 +169,20 @@ class WebcamInfo:
 
 def screen_REL_to_screen_POS_xy(position):
   position_x, position_y = position
-  return position_x * screen_width, position_y * screen_height
\ No newline at end of file
+  return position_x * screen_width, position_y * screen_height
+
+def screen_REL_to_physics_POS_xy(position):
+  position_x, position_y = position
+  return position_x * PHYSICS_WIDTH, position_y * PHYSICS_HEIGHT
+
+def physics_POS_to_screen_POS_xy(position):
+  position_x, position_y = position
+  return position_x * PHYSICS_TO_SCREEN_SCALE_X, position_y * PHYSICS_TO_SCREEN_SCALE_Y
+
+def present_frame():
+  if RENDER_BACKEND == "sdl2":
+    sdl2_renderer.present()
+    return
+  if render_screen is not display_screen:
+    pygame.transform.scale(render_screen, display_screen.get_size(), display_screen)
+  pygame.display.flip()
@@ -0,0 +1,221 @@
+import argparse
+import json
+import numbers
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+
+# A level catalogue is either a single JSON file of level name -> level (levels.json), or a directory holding an
+# index.json and a JSON file per level:
+#   {"loop_from": "level_1", "levels": ["level_0", "level_1", {"name": "winter_1", "file": "seasonal/winter_1.json"}]}
+# Levels listed by name alone are read from <name>.json next to the index. Levels run in index order, then loop back
+# round to "loop_from" (by default the second level, after the intro). Only the index is read at startup. Level files
+# are read and validated the first time they are used, and the most recently used are kept parsed.
+LEVEL_INDEX_FILENAME = "index.json"
+DEFAULT_LEVEL_CACHE_SIZE = 8
+
+
+def is_number(value):
+  return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def is_list_of(value, is_item, length=None):
+  return isinstance(value, list) and (length is None or len(value) == length) and all(is_item(item) for item in value)
+
+
+def is_position(value):
+  return is_list_of(value, is_number, 2)
+
+
+def is_optional_position(value):
+  # Levels without a flag or starting ball hold an empty list
+  return value == [] or is_position(value)
+
+
+def is_line(value):
+  return isinstance(value, dict) and is_position(value.get("start_pos")) and is_position(value.get("end_pos"))
+
+
+def is_background_image(value):
+  return is_line(value) and isinstance(value.get("image"), str)
+
+
+def is_colour(value):
+  return isinstance(value, str) or is_list_of(value, is_number, 3) or is_list_of(value, is_number, 4)
+
+
+def is_grid(value):
+  # [game rect, webcam rect, colour], with rects as [left, top, width, height]
+  return isinstance(value, list) and len(value) == 3 and is_list_of(value[0], is_number, 4) and is_list_of(value[1], is_number, 4) and is_colour(value[2])
+
+
+def is_landmark_pair(value):
+  return is_list_of(value, lambda item: isinstance(item, int), 2)
+
+
+# key -> (required, validator)
+LEVEL_SCHEMA = {
+  "spawn_balls": (True, lambda value: isinstance(value, bool)),
+  "background_images": (True, lambda value: is_list_of(value, is_background_image)),
+  "webcam_pos": (True, is_line),
+  "line_pos": (False, lambda value: is_list_of(value, is_line)),
+  "flag_pos": (False, is_optional_position),
+  "ball_pos": (False, is_optional_position),
+  "grids": (False, lambda value: is_list_of(value, is_grid)),
+  "allowed_limb_connections": (False, lambda value: is_list_of(value, is_landmark_pair)),
+  "allow_head": (False, lambda value: isinstance(value, bool)),
+  "instruction": (False, lambda value: isinstance(value, str)),
+  "quality_level": (False, lambda value: isinstance(value, (str, int)) and not isinstance(value, bool)),
+  "swept_limbs": (False, lambda value: isinstance(value, bool)),
+  "silhouette_colliders": (False, lambda value: isinstance(value, bool)),
+  "player_grids": (False, lambda value: is_list_of(value, lambda grid_indices: is_list_of(grid_indices, lambda item: isinstance(item, int)))),
+  "player_colours": (False, lambda value: is_list_of(value, is_colour) and len(value) > 0),
+  "physics_iterations": (False, lambda value: isinstance(value, int) and value > 0),
+  "physics_sleep_time": (False, lambda value: is_number(value) and value > 0),
+}
+
+
+def validate_level(level_name, level_info, source):
+  """
+  Checks a level against LEVEL_SCHEMA.
+
+  :param source: The file the level was read from, for the error message.
+  :raises ValueError: Listing every missing, unknown or malformed setting of the level.
+  """
+  if not isinstance(level_info, dict):
+    raise ValueError(f"Level {level_name} in {source} is not a JSON object")
+
+  errors = []
+  for key, (is_required, is_valid) in LEVEL_SCHEMA.items():
+    if key not in level_info:
+      if is_required:
+        errors.append(f"missing {key!r}")
+    elif not is_valid(level_info[key]):
+      errors.append(f"malformed {key!r}: {json.dumps(level_info[key])[:80]}")
+  errors += [f"unknown setting {key!r}" for key in level_info if key not in LEVEL_SCHEMA]
+
+  if errors:
+    raise ValueError(f"Level {level_name} in {source}: {', '.join(errors)}")
+
+
+class LevelCatalogue(Mapping):
+  """
+  The game's levels, as a read-only mapping of level name -> level settings, in play order. Names and play order come
+  from the index alone, so iterating over names, len() and `in` never read a level file.
+  """
+
+  def __init__(self, path, cache_size=DEFAULT_LEVEL_CACHE_SIZE):
+    self.path = path
+    self.cache_size = cache_size
+    # name -> parsed level, least recently used first
+    self.level_cache = OrderedDict()
+
+    if os.path.isdir(path):
+      index_path = os.path.join(path, LEVEL_INDEX_FILENAME)
+      with open(index_path, 'r') as file:
+        index = json.load(file)
+
+      # name -> level file, in play order
+      self.level_files = {}
+      for entry in index["levels"]:
+        level_name, level_file = (entry, f"{entry}.json") if isinstance(entry, str) else (entry["name"], entry["file"])
+        if level_name in self.level_files:
+          raise ValueError(f"Level {level_name} is listed twice in {index_path}")
+        self.level_files[level_name] = os.path.join(path, level_file)
+      self.single_file_levels = None
+      loop_from = index.get("loop_from")
+    else:
+      # The whole file is parsed anyway, so its levels all stay in memory and are only validated on first use
+      with open(path, 'r') as file:
+        self.single_file_levels = json.load(file)
+      self.level_files = dict.fromkeys(self.single_file_levels, path)
+      loop_from = None
+
+    if not self.level_files:
+      raise ValueError(f"No levels in {path}")
+
+    # name -> position in play order, so finding the next level does not search the catalogue
+    self.level_positions = {level_name: position for position, level_name in enumerate(self.level_files)}
+    self.level_names = list(self.level_files)
+    if loop_from is not None and loop_from not in self.level_positions:
+      raise ValueError(f"loop_from level {loop_from} is not in {path}")
+    self.loop_from = loop_from if loop_from is not None else self.level_names[min(1, len(self.level_names) - 1)]
+
+  def __getitem__(self, level_name):
+    if level_name in self.level_cache:
+      self.level_cache.move_to_end(level_name)
+      return self.level_cache[level_name]
+
+    level_file = self.level_files[level_name]
+    if self.single_file_levels is not None:
+      level_info = self.single_file_levels[level_name]
+    else:
+      with open(level_file, 'r') as file:
+        level_info = json.load(file)
+    validate_level(level_name, level_info, level_file)
+
+    self.level_cache[level_name] = level_info
+    if self.single_file_levels is None and len(self.level_cache) > self.cache_size:
+      self.level_cache.popitem(last=False)
+    return level_info
+
+  def __iter__(self):
+    return iter(self.level_names)
+
+  def __len__(self):
+    return len(self.level_names)
+
+  def __contains__(self, level_name):
+    return level_name in self.level_positions
+
+  def get_first_level(self):
+    return self.level_names[0]
+
+  def get_next_level(self, level_name):
+    position = self.level_positions[level_name] + 1
+    return self.level_names[position] if position < len(self.level_names) else self.loop_from
+
+
+def validate_catalogue(path):
+  # Loads every level in turn, returning the number that failed validation
+  level_catalogue = LevelCatalogue(path, cache_size=1)
+  error_count = 0
+  for level_name in level_catalogue:
+    try:
+      level_catalogue[level_name]
+    except (OSError, ValueError) as error:
+      print(f"[levels] {error}")
+      error_count += 1
+  print(f"[levels] {len(level_catalogue) - error_count} of {len(level_catalogue)} levels in {path} are valid")
+  return error_count
+
+
+def split_level_file(levels_path, output_path):
+  # Writes a levels.json style file out as a catalogue directory, with a file per level
+  with open(levels_path, 'r') as file:
+    levels = json.load(file)
+
+  os.makedirs(output_path, exist_ok=True)
+  for level_name, level_info in levels.items():
+    with open(os.path.join(output_path, f"{level_name}.json"), 'w') as file:
+      json.dump(level_info, file, indent=2)
+  with open(os.path.join(output_path, LEVEL_INDEX_FILENAME), 'w') as file:
+    json.dump({"levels": list(levels)}, file, indent=2)
+  print(f"[levels] wrote {len(levels)} levels to {output_path}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Check a level catalogue, or split a single levels file into a catalogue directory.")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+
+  validate_parser = subparsers.add_parser("validate", help="load and validate every level")
+  validate_parser.add_argument("path", help="levels.json style file, or a directory with an index.json")
+
+  split_parser = subparsers.add_parser("split", help="write a levels.json style file out as a directory of level files")
+  split_parser.add_argument("levels_path")
+  split_parser.add_argument("output_path")
+
+  args = parser.parse_args()
+  if args.command == "validate":
+    raise SystemExit(1 if validate_catalogue(args.path) else 0)
+  split_level_file(args.levels_path, args.output_path)
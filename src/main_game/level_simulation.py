@@ -0,0 +1,94 @@
+import random
+import time
+
+import numpy as np
+
+from main_game.game_body import update_game_body
+from main_game.globals import SIMULATION_MAX_FRAMES, level_data, physics_space
+from main_game.main_game import load_level
+from main_game.physics_objects import (add_physics_line, add_remove_balls,
+                                       is_touching_flag, step_physics)
+from pose_detection.landmark_cache_source import load_landmark_cache
+from pose_detection.pose_landmarks import POSE_LANDMARK_COUNT
+
+
+def get_random_limb_placements(current_level, placement_count, limbs_per_placement, seed=0):
+  # Each placement is a list of limb lines in screen REL coordinates, inside the level's game grids
+  rng = random.Random(seed)
+  game_rects = [grid[0] for grid in level_data[current_level].get("grids", [])]
+  if not game_rects:
+    raise ValueError(f"Level {current_level} has no grids, so there is nowhere to place limbs")
+
+  placements = []
+  for _ in range(placement_count):
+    limb_lines = []
+    for _ in range(limbs_per_placement):
+      game_left, game_top, game_width, game_height = rng.choice(game_rects)
+      start_pos = (game_left + rng.random() * game_width, game_top + rng.random() * game_height)
+      end_pos = (game_left + rng.random() * game_width, game_top + rng.random() * game_height)
+      limb_lines.append((start_pos, end_pos))
+    placements.append(limb_lines)
+
+  return placements
+
+
+def get_pose_clip_points(landmarks_path):
+  # A 1 x 33 x (x, y) player points array for every frame of a landmark cache, holding the previous pose over frames without one
+  landmarks, timestamps = load_landmark_cache(landmarks_path)
+
+  player_points_list = []
+  player_points = np.empty((0, POSE_LANDMARK_COUNT, 2))
+  for frame_landmarks in landmarks:
+    if not np.isnan(frame_landmarks[0, 0]):
+      player_points = np.array(frame_landmarks[np.newaxis, :, :2], dtype=np.float64)
+    player_points_list.append(player_points)
+
+  return player_points_list, np.asarray(timestamps)
+
+
+def simulate_level(current_level, limb_lines=(), landmarks_path=None, max_frames=SIMULATION_MAX_FRAMES, seed=0):
+  """
+  Runs a level headlessly until a ball reaches the flag, using the physics space of this process.
+
+  :param current_level: The name of the level in levels.json.
+  :param limb_lines: Static limb lines to place, in screen REL coordinates.
+  :param landmarks_path: Optional landmark cache to replay as the player's body, at 60 frames a second.
+  :param max_frames: The number of frames to give up after.
+  :param seed: Seed for the ball spawner.
+  :return: A tuple of (reached flag, frames taken, seconds taken).
+  """
+  start_time = time.perf_counter()
+  random.seed(seed)
+
+  balls, level_lines, flag, _, grids, allow_head, _ = load_level(current_level, [], [], None)
+  limbs = [add_physics_line(start_pos, end_pos) for start_pos, end_pos in limb_lines]
+
+  player_points_list, timestamps = get_pose_clip_points(landmarks_path) if landmarks_path else ([], None)
+  game_limbs = []
+  game_heads = []
+
+  reached_flag = False
+  frame = 0
+  while frame < max_frames:
+    balls = add_remove_balls(balls, current_level)
+
+    if player_points_list:
+      clip_index = min(np.searchsorted(timestamps, frame * 1000 / 60, side="right") - 1, len(player_points_list) - 1)
+      player_points = player_points_list[max(clip_index, 0)]
+      game_limbs, game_heads = update_game_body(game_limbs, game_heads, current_level, player_points, [0] * len(player_points), grids, allow_head, level_data)
+
+    if is_touching_flag(flag, balls):
+      reached_flag = True
+      break
+
+    step_physics()
+    frame += 1
+
+  # Workers are reused between simulations, so leave the space empty for the next one
+  physics_objects = balls + level_lines + limbs + [line for line, _, _ in game_limbs] + [head[0] for head in game_heads]
+  if flag:
+    physics_objects.append(flag)
+  for physics_object in physics_objects:
+    physics_space.remove(*physics_object)
+
+  return reached_flag, frame, time.perf_counter() - start_time
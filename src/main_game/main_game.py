@@ -1,3 +1,4 @@
+import gc
 import json
 import math
 import random
@@ -9,28 +10,54 @@ import pymunk
 import pymunk.pygame_util
 from pygame.locals import *
 
-from main_game.drawing import draw_game, load_and_scale_background_images
-from main_game.game_body import update_game_body
-from main_game.globals import (WebcamInfo, level_data, physics_space,
-                               render_clock, render_font, screen_height,
-                               screen_width)
+from main_game.drawing import (get_prefetched_level,
+                               load_and_scale_background_images,
+                               prefetch_background_images, update_hud)
+from main_game.game_body import (remove_silhouette_colliders,
+                                 reset_limb_sweeps,
+                                 set_level_silhouette_colliders,
+                                 update_game_body,
+                                 update_silhouette_colliders)
+from main_game.globals import (GC_FULL_INTERVAL, GC_IDLE_INTERVAL,
+                               GC_MAX_DEFER, HUD_RATE,
+                               MAX_PHYSICS_TICKS_PER_FRAME, PHYSICS_TIMESTEP,
+                               QUALITY_LEVELS, RENDER_BACKEND,
+                               SCHEDULE_STATS_INTERVAL, SCHEDULE_STATS_PATH,
+                               SHOW_STATS_HUD, STAGE_BUDGETS, TARGET_FPS,
+                               WebcamInfo, level_data, physics_space,
+                               present_frame, render_clock, render_font,
+                               screen_height, screen_width)
+from main_game.memory_tracking import (end_memory_frame, memory_stage,
+                                       start_memory_tracking)
+from main_game.physics_budget import (apply_level_physics_budget,
+                                      get_sleeping_ball_count)
 from main_game.physics_objects import (add_physics_ball, add_physics_flag,
                                        add_physics_lines_from_position_list,
                                        add_remove_balls, is_touching_flag,
-                                       remove_dead_balls)
+                                       remove_dead_balls, step_physics)
+from main_game.quality_governor import (get_quality_level,
+                                        set_level_quality_override,
+                                        update_quality_governor)
+from main_game.stage_scheduler import StageScheduler
 from main_game.webcam_and_pose_info import (are_arms_above_head,
                                             get_webcam_and_pose_info)
 
+if RENDER_BACKEND == "sdl2":
+  from main_game.texture_drawing import draw_game
+else:
+  from main_game.drawing import draw_game
+
 # --- Load level data from JSON ---
 
+def get_next_level(current_level):
+  # Levels run in catalogue order, then loop back round to the catalogue's loop_from level
+  return level_data.get_next_level(current_level)
+
 def level_generator():
-  levels_list = list(level_data.keys())
-  n = 0
+  current_level = level_data.get_first_level()
   while True:
-    yield levels_list[n]
-    n = (n + 1) % len(levels_list)
-    if n == 0:
-      n = 1
+    yield current_level
+    current_level = get_next_level(current_level)
 
 def load_level(current_level, balls=[], level_lines=[], flag=None):
   for ball in balls:
@@ -41,6 +68,9 @@ def load_level(current_level, balls=[], level_lines=[], flag=None):
     physics_space.remove(*flag)
 
   level_info = level_data[current_level]
+  set_level_quality_override(level_info)
+  apply_level_physics_budget(level_info)
+  set_level_silhouette_colliders(level_info)
 
   def parse_grids(grids):
     parsed_grids = []
@@ -70,22 +100,58 @@ def load_level(current_level, balls=[], level_lines=[], flag=None):
 
   return balls, level_lines, flag, bg_images, grids, allow_head, text
 
+@dataclass
+class GameState:
+    levels: any
+    current_level: str
+    balls: list
+    level_lines: list
+    flag: any
+    bg_images: list
+    grids: list
+    allow_head: bool
+    text: str
+    game_limbs: list
+    game_heads: list
+    game_silhouette: tuple
+    # Set on a level change, so the body is rebuilt in the new level's grids without waiting for a new pose
+    is_game_body_stale: bool = False
+
 def initialise_game():
     levels = level_generator()
     current_level = next(levels)
 
     balls, level_lines, flag, bg_images, grids, allow_head, text = load_level(current_level)
 
-    is_main_game_loop_running = True
-
     game_limbs = []
     game_heads = []
+    game_silhouette = [], []
+    reset_limb_sweeps()
+
+    return GameState(levels, current_level, balls, level_lines, flag, bg_images, grids, allow_head, text, game_limbs, game_heads, game_silhouette, is_game_body_stale=True)
+
+def update_game_state(game_state: GameState, player_points, player_ids, points_dict, silhouette_contours, has_new_pose=True):
+  # Returns True when the player moves on to the next level
+  gs = game_state
+
+  with memory_stage("balls"):
+    gs.balls = add_remove_balls(gs.balls, gs.current_level)
+  # The body colliders only change with the pose, so they are kept as they are until the next pose arrives
+  if has_new_pose or gs.is_game_body_stale:
+    with memory_stage("game_body"):
+      gs.game_limbs, gs.game_heads = update_game_body(gs.game_limbs, gs.game_heads, gs.current_level, player_points, player_ids, gs.grids, gs.allow_head, level_data)
+      gs.game_silhouette = update_silhouette_colliders(gs.game_silhouette, gs.current_level, silhouette_contours, gs.grids)
+      gs.is_game_body_stale = False
 
-    head_width = None
-    head_height = None
-    head_pos = None
+  with memory_stage("level"):
+    if is_touching_flag(gs.flag, gs.balls) or (gs.current_level == "level_0" and are_arms_above_head(points_dict)):
+      gs.current_level = next(gs.levels)
+      gs.balls, gs.level_lines, gs.flag, gs.bg_images, gs.grids, gs.allow_head, gs.text = load_level(gs.current_level, gs.balls, gs.level_lines, gs.flag)
+      gs.game_silhouette = remove_silhouette_colliders(gs.game_silhouette)
+      gs.is_game_body_stale = True
+      return True
 
-    return levels, current_level, balls, level_lines, flag, bg_images, grids, allow_head, text, is_main_game_loop_running, game_limbs, game_heads, head_width, head_height, head_pos
+  return False
 
 def get_events():
   is_main_game_loop_running = True
@@ -97,34 +163,113 @@ def get_events():
   return is_main_game_loop_running
 
 
+def get_hud_text(game_state: GameState, scheduler: StageScheduler):
+  simulation_stats = scheduler.get_stats()["simulation"]
+  return (f"{render_clock.get_fps():.0f} fps  {QUALITY_LEVELS[get_quality_level()]['name']} quality  "
+          f"{len(game_state.balls)} balls ({get_sleeping_ball_count(game_state.balls)} asleep)  simulation {simulation_stats['mean_ms']:.2f} ms")
+
+
+def collect_garbage(generation):
+  # Automatic collection is disabled while the game runs, so collections only happen in spare frame time
+  gc.collect(generation)
+
+
 # --- Main Game Loop ---
-def start_game(get_pose_results_callback):
+def start_game(get_pose_results_callback, session_recorder=None, simulation_tick_callback=None):
+
+  if session_recorder:
+    random.seed(session_recorder.seed)
+
+  gs = initialise_game()
+  is_main_game_loop_running = True
+
+  # Level data, assets and modules live for the whole game, so keep them out of every later collection
+  gc.collect()
+  gc.freeze()
+  gc.disable()
+
+  start_memory_tracking()
+
+  webcam_info = points_dict = pose_results = None
+  simulated_pose_results = None
+
+  ### GET KEYBOARD EVENTS ###
+  def run_events_stage():
+    nonlocal is_main_game_loop_running
+    with memory_stage("events"):
+      is_main_game_loop_running = get_events()
+
+  ### GET WEBCAM STATE ###
+  def run_pose_stage():
+    # The preview is only rebuilt when the camera delivers a new frame
+    nonlocal webcam_info, points_dict, pose_results
+    with memory_stage("webcam"):
+      webcam_info, points_dict, pose_results = get_webcam_and_pose_info(get_pose_results_callback, gs.current_level)
+
+  ### UPDATE GAME STATE ###
+  def run_simulation_tick():
+    # One fixed timestep of gameplay. Sessions are recorded and replayed tick by tick.
+    nonlocal simulated_pose_results
+    has_new_pose = pose_results is not simulated_pose_results
+    simulated_pose_results = pose_results
+
+    if session_recorder and has_new_pose:
+      session_recorder.record_pose_input(pose_results.player_points, pose_results.player_ids, pose_results.silhouette_contours)
+
+    if update_game_state(gs, pose_results.player_points, pose_results.player_ids, points_dict, pose_results.silhouette_contours, has_new_pose) and session_recorder:
+      session_recorder.record_level(gs.current_level)
+
+    with memory_stage("physics"):
+      step_physics()
+
+    if session_recorder:
+      session_recorder.end_frame()
+
+    # Lets a paced pose source deliver its next pose
+    if simulation_tick_callback:
+      simulation_tick_callback()
+
+  def run_hud_stage():
+    update_hud(get_hud_text(gs, scheduler), render_font)
 
-  levels, current_level, balls, level_lines, flag, bg_images, grids, allow_head, text, is_main_game_loop_running, game_limbs, game_heads, head_width, head_height, head_pos = initialise_game()
+  ### DRAW GAME ###
+  def run_draw_stage():
+    with memory_stage("draw"):
+      draw_game(gs.bg_images, gs.current_level, gs.balls, gs.flag, webcam_info, gs.level_lines, gs.game_limbs, gs.game_heads, gs.game_silhouette[1], gs.grids, gs.text, screen_width, screen_height, render_font)
+      present_frame()
 
-  while is_main_game_loop_running:
-    ### GET KEYBOARD EVENTS ###
-    is_main_game_loop_running = get_events()
+  scheduler = StageScheduler(1 / TARGET_FPS)
+  scheduler.add_stage("events", run_events_stage, STAGE_BUDGETS["events"])
+  scheduler.add_stage("pose", run_pose_stage, STAGE_BUDGETS["pose"])
+  scheduler.add_fixed_rate_stage("simulation", run_simulation_tick, STAGE_BUDGETS["simulation"], 1 / PHYSICS_TIMESTEP, MAX_PHYSICS_TICKS_PER_FRAME)
+  scheduler.add_stage("hud", run_hud_stage, STAGE_BUDGETS["hud"], rate=HUD_RATE, is_due=lambda: SHOW_STATS_HUD)
+  scheduler.add_stage("draw", run_draw_stage, STAGE_BUDGETS["draw"])
 
-    ### GET WEBCAM STATE ###
-    webcam_info, head_width, head_height, head_pos, pose_lines, points_dict = get_webcam_and_pose_info(get_pose_results_callback, current_level)
-    
-    ### UPDATE GAME STATE ###
-    balls = add_remove_balls(balls, current_level)
-    game_limbs, game_heads = update_game_body(game_limbs, game_heads, current_level, pose_lines, grids, allow_head, head_width, head_height, head_pos, level_data)
+  # Deferrable work, which only runs in time left over at the end of a frame
+  scheduler.add_idle_task("prefetch", lambda: prefetch_background_images(get_next_level(gs.current_level)), 0.0,
+                          is_due=lambda: get_prefetched_level() != get_next_level(gs.current_level))
+  scheduler.add_idle_task("stats", lambda: scheduler.report_stats(SCHEDULE_STATS_PATH), SCHEDULE_STATS_INTERVAL)
+  scheduler.add_idle_task("gc", lambda: collect_garbage(1), GC_IDLE_INTERVAL, max_defer=GC_MAX_DEFER)
+  scheduler.add_idle_task("gc_full", lambda: collect_garbage(2), GC_FULL_INTERVAL, max_defer=GC_FULL_INTERVAL * 2)
 
-    if is_touching_flag(flag, balls) or (current_level == "level_0" and are_arms_above_head(points_dict)):
-      current_level = next(levels)
-      balls, level_lines, flag, bg_images, grids, allow_head, text = load_level(current_level, balls, level_lines, flag)
+  try:
+    while is_main_game_loop_running:
+      scheduler.run_frame()
 
-    ### DRAW GAME ###
-    draw_game(bg_images, current_level, balls, flag, webcam_info, level_lines, game_limbs, game_heads, grids, text, screen_width, screen_height, render_font)
-    pygame.display.flip()
+      ### CLOCK UPDATES ###
+      render_clock.tick(TARGET_FPS)
+      # Quality changes apply from the next simulation tick
+      if update_quality_governor(scheduler.frame_work_time) and session_recorder:
+        session_recorder.record_quality(get_quality_level())
 
-    ### CLOCK UPDATES ###
-    render_clock.tick(60)
-    physics_space.step(1 / 60.0)
+      end_memory_frame(gs.balls, gs.level_lines, gs.flag, gs.game_limbs, gs.game_heads, gs.game_silhouette[1])
+  finally:
+    # An exception in a stage must not leave the rest of the process without garbage collection
+    gc.enable()
+    gc.unfreeze()
 
+    if session_recorder:
+      session_recorder.close()
 
 if __name__ == "__main__":
   start_game()
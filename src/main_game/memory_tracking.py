@@ -0,0 +1,102 @@
+import os
+import tracemalloc
+from contextlib import contextmanager
+
+from main_game.globals import (MEMORY_REPORT_INTERVAL, MEMORY_SNAPSHOT_DIR,
+                               MEMORY_SNAPSHOT_INTERVAL,
+                               MEMORY_TRACKING_FRAMES, MEMORY_TRACKING_MODE,
+                               physics_space)
+from main_game.physics_objects import swept_collider_pool
+
+# stage name -> [net bytes retained, largest transient peak in bytes, number of calls]
+stage_allocations = {}
+tracked_frame_count = 0
+last_leak_report = None
+
+
+def start_memory_tracking():
+  if MEMORY_TRACKING_MODE and not tracemalloc.is_tracing():
+    os.makedirs(MEMORY_SNAPSHOT_DIR, exist_ok=True)
+    tracemalloc.start(MEMORY_TRACKING_FRAMES)
+    print(f"Memory tracking enabled, writing snapshots to {MEMORY_SNAPSHOT_DIR}/")
+
+
+@contextmanager
+def memory_stage(stage_name):
+  # Stages must not be nested, as measuring a stage resets the tracemalloc peak
+  if not tracemalloc.is_tracing():
+    yield
+    return
+
+  tracemalloc.reset_peak()
+  current_before, _ = tracemalloc.get_traced_memory()
+  try:
+    yield
+  finally:
+    current_after, peak = tracemalloc.get_traced_memory()
+
+    stage_info = stage_allocations.setdefault(stage_name, [0, 0, 0])
+    stage_info[0] += current_after - current_before
+    stage_info[1] = max(stage_info[1], peak - current_before)
+    stage_info[2] += 1
+
+
+def get_tracked_physics_object_count(balls, level_lines, flag, game_limbs, game_heads, silhouette_lines):
+  # Every tracked physics object is a single (shape, body) pair
+  tracked_count = len(balls) + len(level_lines) + len(game_limbs) + len(game_heads) + len(silhouette_lines) + len(swept_collider_pool)
+  if flag:
+    tracked_count += 1
+  return tracked_count
+
+
+def check_physics_leaks(balls, level_lines, flag, game_limbs, game_heads, silhouette_lines):
+  global last_leak_report
+
+  tracked_count = get_tracked_physics_object_count(balls, level_lines, flag, game_limbs, game_heads, silhouette_lines)
+  live_bodies = len(physics_space.bodies)
+  live_shapes = len(physics_space.shapes)
+
+  is_leaking = live_bodies != tracked_count or live_shapes != tracked_count
+  leak_report = (live_bodies, live_shapes, tracked_count) if is_leaking else None
+
+  # Only report when the divergence changes, rather than on every frame
+  if leak_report != last_leak_report:
+    if is_leaking:
+      print(f"[memory] LEAK: physics space holds {live_bodies} bodies / {live_shapes} shapes, "
+            f"but only {tracked_count} are tracked (balls={len(balls)}, level_lines={len(level_lines)}, "
+            f"flag={int(bool(flag))}, game_limbs={len(game_limbs)}, game_heads={len(game_heads)}, silhouette_lines={len(silhouette_lines)}, swept_colliders={len(swept_collider_pool)})")
+    else:
+      print(f"[memory] physics space back in sync ({tracked_count} tracked objects)")
+    last_leak_report = leak_report
+
+  return is_leaking
+
+
+def report_stage_allocations():
+  current, _ = tracemalloc.get_traced_memory()
+  print(f"[memory] frame {tracked_frame_count}: {current / 1024:.1f} KiB traced")
+  for stage_name, (net_bytes, peak_bytes, calls) in stage_allocations.items():
+    print(f"[memory]   {stage_name:<12} net {net_bytes / max(calls, 1):+9.1f} B/frame, "
+          f"total {net_bytes / 1024:+9.1f} KiB, peak {peak_bytes / 1024:8.1f} KiB")
+
+
+def write_memory_snapshot():
+  snapshot_path = os.path.join(MEMORY_SNAPSHOT_DIR, f"snapshot_{tracked_frame_count:08d}.tracemalloc")
+  tracemalloc.take_snapshot().dump(snapshot_path)
+  print(f"[memory] wrote {snapshot_path}")
+
+
+def end_memory_frame(balls, level_lines, flag, game_limbs, game_heads, silhouette_lines):
+  global tracked_frame_count
+
+  if not tracemalloc.is_tracing():
+    return
+
+  tracked_frame_count += 1
+
+  check_physics_leaks(balls, level_lines, flag, game_limbs, game_heads, silhouette_lines)
+
+  if tracked_frame_count % MEMORY_REPORT_INTERVAL == 0:
+    report_stage_allocations()
+  if tracked_frame_count % MEMORY_SNAPSHOT_INTERVAL == 0:
+    write_memory_snapshot()
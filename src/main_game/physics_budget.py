@@ -0,0 +1,76 @@
+import pymunk
+
+from main_game.globals import (BALL_COLLISION_TYPE, LEVEL_LINE_COLLISION_TYPE,
+                               PHYSICS_IDLE_SPEED, PHYSICS_ITERATIONS,
+                               PHYSICS_RESTING_SPEED, PHYSICS_SLEEP_TIME,
+                               PHYSICS_WAKE_DISTANCE, physics_space)
+
+# Balls at rest are put to sleep by pymunk, and cost next to nothing until something touches them. Limbs and heads
+# are static shapes added in place, which pymunk does not treat as touching a sleeping body, so the balls near them
+# are woken by hand whenever the body is rebuilt. Above the live ball limit, the oldest balls at rest are evicted.
+is_physics_budget_enabled = True
+RESTING_COLLISION_TYPES = (BALL_COLLISION_TYPE, LEVEL_LINE_COLLISION_TYPE)
+
+
+def set_physics_budget_enabled(enabled):
+  # Sessions recorded before the physics budget replay with every ball awake and none evicted
+  global is_physics_budget_enabled
+  is_physics_budget_enabled = enabled
+
+
+def apply_level_physics_budget(level_info):
+  """
+  Sets the solver iterations and sleep thresholds of the physics space for a level.
+
+  :param level_info: The level's entry in levels.json, which can set "physics_iterations" and "physics_sleep_time".
+  """
+  physics_space.iterations = level_info.get("physics_iterations", PHYSICS_ITERATIONS)
+  if is_physics_budget_enabled:
+    physics_space.sleep_time_threshold = level_info.get("physics_sleep_time", PHYSICS_SLEEP_TIME)
+    physics_space.idle_speed_threshold = PHYSICS_IDLE_SPEED
+  else:
+    physics_space.sleep_time_threshold = float("inf")
+    physics_space.idle_speed_threshold = 0
+
+
+def wake_bodies_near(shapes, distance=PHYSICS_WAKE_DISTANCE):
+  for shape in shapes:
+    bb = shape.bb
+    for nearby_shape in physics_space.bb_query(pymunk.BB(bb.left - distance, bb.bottom - distance, bb.right + distance, bb.top + distance), pymunk.ShapeFilter()):
+      if nearby_shape.body.is_sleeping:
+        nearby_shape.body.activate()
+
+
+def get_sleeping_ball_count(balls):
+  return sum(ball_body.is_sleeping for _, ball_body in balls)
+
+
+def is_ball_resting(ball_body):
+  # Balls in a pile bounce off each other by a little on every step, so rarely all fall asleep together, and a slow
+  # ball counts as well. Only a ball lying on level lines or other balls is at rest: one held by a player, or
+  # touching the flag, is in play.
+  if not ball_body.is_sleeping and ball_body.velocity.length > PHYSICS_RESTING_SPEED:
+    return False
+  arbiters = []
+  ball_body.each_arbiter(arbiters.append)
+  return len(arbiters) > 0 and all(shape.collision_type in RESTING_COLLISION_TYPES for arbiter in arbiters for shape in arbiter.shapes)
+
+
+def evict_resting_balls(balls, max_live_balls):
+  """
+  Removes the oldest balls at rest until there are at most max_live_balls. Balls that are still moving are never
+  evicted, so there can be more than max_live_balls until they come to rest.
+
+  :param balls: Live balls, oldest first.
+  :return: The balls left in the space, oldest first.
+  """
+  eviction_count = len(balls) - max_live_balls
+  if eviction_count <= 0 or not is_physics_budget_enabled:
+    return balls
+
+  # Removing a ball wakes the pile it rests in, so the balls to evict are all picked before any are removed
+  evicted_balls = [ball for ball in balls if is_ball_resting(ball[1])][:eviction_count]
+  for ball in evicted_balls:
+    physics_space.remove(*ball)
+
+  return [ball for ball in balls if ball not in evicted_balls] if evicted_balls else balls
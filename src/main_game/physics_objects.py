@@ -5,12 +5,40 @@ import pymunk
 import pymunk.pygame_util
 from pygame.locals import *
 
-from main_game.globals import (BALL_ELASTICITY, BALL_FRICTION, BALL_MASS,
-                               BALL_RADIUS, FLAG_WIDTH, FLAT_POLE_HEIGHT,
-                               WebcamInfo, level_data, physics_space,
-                               screen_height, screen_REL_to_screen_POS_xy)
+from main_game.globals import (BALL_COLLISION_TYPE, BALL_ELASTICITY,
+                               BALL_FRICTION, BALL_MASS, BALL_RADIUS,
+                               FLAG_WIDTH, FLAT_POLE_HEIGHT,
+                               LEVEL_LINE_COLLISION_TYPE,
+                               PHYSICS_HEIGHT, PHYSICS_TIMESTEP, WebcamInfo,
+                               level_data, physics_space,
+                               screen_REL_to_physics_POS_xy)
+from main_game.physics_budget import evict_resting_balls
+from main_game.quality_governor import get_quality_setting
 
 
+# Swept limb colliders only collide for the next physics tick. Adding a shape to the space costs far more than
+# moving one, so they stay in the space and are reused, colliding with nothing while they are not in use.
+swept_collider_pool = []
+swept_colliders_in_use = 0
+UNUSED_SWEPT_COLLIDER_FILTER = pymunk.ShapeFilter(categories=0, mask=0)
+
+
+def step_physics():
+  physics_substeps = get_quality_setting("physics_substeps")
+  for _ in range(physics_substeps):
+    physics_space.step(PHYSICS_TIMESTEP / physics_substeps)
+
+  release_swept_colliders()
+
+
+def release_swept_colliders():
+  global swept_colliders_in_use
+
+  for shape, body in swept_collider_pool[:swept_colliders_in_use]:
+    shape.filter = UNUSED_SWEPT_COLLIDER_FILTER
+    body.velocity = (0, 0)
+  swept_colliders_in_use = 0
+
 def is_touching_flag(flag, balls):
   if flag is None:
     return False
@@ -22,12 +50,17 @@ def is_touching_flag(flag, balls):
   return False
 
 def add_remove_balls(balls, current_level):
+  max_live_balls = get_quality_setting("max_live_balls")
   if level_data[current_level]["spawn_balls"]:
-    # Add new balls to the game randomly
+    # Add new balls to the game randomly, making room at the limit by evicting the oldest ball at rest
     if random.random() < 0.01:
+      if len(balls) >= max_live_balls:
+        balls = evict_resting_balls(balls, max_live_balls - 1)
+      if len(balls) < max_live_balls:
         balls.append(add_physics_ball((0.11, 0.05)))
 
   balls = remove_dead_balls(balls)
+  balls = evict_resting_balls(balls, max_live_balls)
   return balls
 
 def remove_dead_balls(balls):
@@ -35,7 +68,7 @@ def remove_dead_balls(balls):
 
   for ball in balls:
     _, ball_body = ball
-    if ball_body.position.y > screen_height * 1.1:
+    if ball_body.position.y > PHYSICS_HEIGHT * 1.1:
       physics_space.remove(*ball)
     else:
       new_balls.append(ball)
@@ -47,7 +80,9 @@ def add_physics_lines_from_position_list(positions):
   for line_pos in positions:
     start_position = line_pos["start_pos"]  # Anna was here
     end_position = line_pos["end_pos"]
-    lines.append(add_physics_line(start_position, end_position))
+    line = add_physics_line(start_position, end_position)
+    line[0].collision_type = LEVEL_LINE_COLLISION_TYPE
+    lines.append(line)
   return lines
 
 def add_physics_ellipse(pos, width, height, num_segments=50):
@@ -64,14 +99,40 @@ def add_physics_ellipse(pos, width, height, num_segments=50):
   return shape, body
 
 
+def add_physics_sweep(vertices, velocity):
+  # A kinematic body moves by its velocity over the tick, so it starts one timestep back and ends the tick with its
+  # convex hull over vertices. Balls it hits are pushed along at its velocity.
+  global swept_colliders_in_use
+
+  if swept_colliders_in_use == len(swept_collider_pool):
+    body = pymunk.Body(body_type=pymunk.Body.KINEMATIC)
+    shape = pymunk.Poly(body, vertices, radius=1)
+
+    shape.elasticity = 0.0
+    shape.friction = 0.0
+
+    physics_space.add(body, shape)
+    swept_collider_pool.append((shape, body))
+  else:
+    shape, body = swept_collider_pool[swept_colliders_in_use]
+    shape.unsafe_set_vertices(vertices)
+    shape.filter = pymunk.ShapeFilter()
+
+  body.position = (-velocity[0] * PHYSICS_TIMESTEP, -velocity[1] * PHYSICS_TIMESTEP)
+  body.velocity = velocity
+  swept_colliders_in_use += 1
+
+  return shape, body
+
+
 def add_physics_flag(position):
   body = pymunk.Body(body_type=pymunk.Body.STATIC)
 
-  screen_position_x, screen_position_y = screen_REL_to_screen_POS_xy(position)
+  physics_position_x, physics_position_y = screen_REL_to_physics_POS_xy(position)
 
-  # shape = pymunk.Poly(body, [(screen_position_x, screen_position_y), (screen_position_x + FLAG_WIDTH, screen_position_y), (screen_position_x,
-  #                     screen_position_y - FLAG_WIDTH - FLAT_POLE_HEIGHT), (screen_position_x + FLAG_WIDTH, screen_position_y - FLAG_WIDTH - FLAT_POLE_HEIGHT)])
-  shape = pymunk.Segment(body, (screen_position_x, screen_position_y), (screen_position_x, screen_position_y - FLAG_WIDTH - FLAT_POLE_HEIGHT), 1)
+  # shape = pymunk.Poly(body, [(physics_position_x, physics_position_y), (physics_position_x + FLAG_WIDTH, physics_position_y), (physics_position_x,
+  #                     physics_position_y - FLAG_WIDTH - FLAT_POLE_HEIGHT), (physics_position_x + FLAG_WIDTH, physics_position_y - FLAG_WIDTH - FLAT_POLE_HEIGHT)])
+  shape = pymunk.Segment(body, (physics_position_x, physics_position_y), (physics_position_x, physics_position_y - FLAG_WIDTH - FLAT_POLE_HEIGHT), 1)
 
   shape.elasticity = 0.0
   shape.friction = 0.0
@@ -85,11 +146,12 @@ def add_physics_ball(position):
   inertia = pymunk.moment_for_circle(BALL_MASS, 0, BALL_RADIUS, (0, 0))
 
   body = pymunk.Body(BALL_MASS, inertia)
-  body.position = screen_REL_to_screen_POS_xy(position)
+  body.position = screen_REL_to_physics_POS_xy(position)
 
   shape = pymunk.Circle(body, BALL_RADIUS)
   shape.elasticity = BALL_ELASTICITY
   shape.friction = BALL_FRICTION
+  shape.collision_type = BALL_COLLISION_TYPE
 
   physics_space.add(body, shape)
 
@@ -99,7 +161,7 @@ def add_physics_ball(position):
 def add_physics_line(start_position, end_position):
   body = pymunk.Body(body_type=pymunk.Body.STATIC)
 
-  shape = pymunk.Segment(body, screen_REL_to_screen_POS_xy(start_position), screen_REL_to_screen_POS_xy(end_position), radius=1)
+  shape = pymunk.Segment(body, screen_REL_to_physics_POS_xy(start_position), screen_REL_to_physics_POS_xy(end_position), radius=1)
 
   shape.elasticity = 0.0
   shape.friction = 0.0
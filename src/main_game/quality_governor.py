@@ -0,0 +1,88 @@
+from main_game.globals import (DEFAULT_QUALITY_LEVEL, QUALITY_DOWNGRADE_LOAD,
+                               QUALITY_DOWNGRADE_WINDOWS, QUALITY_LEVELS,
+                               QUALITY_UPGRADE_LOAD, QUALITY_UPGRADE_WINDOWS,
+                               QUALITY_WINDOW_FRAMES, TARGET_FPS)
+
+governed_quality_level = DEFAULT_QUALITY_LEVEL
+pinned_quality_level = None
+
+window_frame_times = []
+overloaded_windows = 0
+underloaded_windows = 0
+
+
+def get_quality_level():
+  return governed_quality_level if pinned_quality_level is None else pinned_quality_level
+
+
+def get_quality_setting(setting_name):
+  return QUALITY_LEVELS[get_quality_level()][setting_name]
+
+
+def get_pose_inference_scale():
+  # Read by the pose detection thread
+  return get_quality_setting("pose_inference_scale")
+
+
+def parse_quality_level(quality_level):
+  if isinstance(quality_level, str):
+    return [quality["name"] for quality in QUALITY_LEVELS].index(quality_level)
+  return max(0, min(int(quality_level), len(QUALITY_LEVELS) - 1))
+
+
+def set_governed_quality_level(quality_level, reason="set"):
+  global governed_quality_level, overloaded_windows, underloaded_windows
+
+  previous_quality_level = get_quality_level()
+  governed_quality_level = quality_level
+  overloaded_windows = 0
+  underloaded_windows = 0
+
+  if get_quality_level() != previous_quality_level:
+    print(f"[quality] {QUALITY_LEVELS[previous_quality_level]['name']} -> {QUALITY_LEVELS[get_quality_level()]['name']} ({reason})")
+
+
+def set_level_quality_override(level_info):
+  global pinned_quality_level
+
+  previous_quality_level = get_quality_level()
+  pinned_quality_level = parse_quality_level(level_info["quality_level"]) if "quality_level" in level_info else None
+
+  if get_quality_level() != previous_quality_level:
+    print(f"[quality] {QUALITY_LEVELS[previous_quality_level]['name']} -> {QUALITY_LEVELS[get_quality_level()]['name']} (pinned by level)")
+
+
+def update_quality_governor(frame_work_time):
+  """
+  Steps the quality level down or up to hold TARGET_FPS, with hysteresis.
+
+  :param frame_work_time: Seconds spent on the last frame, excluding time spent waiting for the frame clock.
+  :return: True if the governed quality level changed.
+  """
+  global overloaded_windows, underloaded_windows
+
+  # Frame times under a pinned level say nothing about the governed level
+  if pinned_quality_level is not None:
+    window_frame_times.clear()
+    return False
+
+  window_frame_times.append(frame_work_time)
+  if len(window_frame_times) < QUALITY_WINDOW_FRAMES:
+    return False
+
+  frame_load = sum(window_frame_times) / len(window_frame_times) * TARGET_FPS
+  window_frame_times.clear()
+
+  # Several windows in a row have to agree before stepping, and stepping up needs far more headroom than
+  # stepping down, so the governor does not oscillate between two levels
+  overloaded_windows = overloaded_windows + 1 if frame_load > QUALITY_DOWNGRADE_LOAD else 0
+  underloaded_windows = underloaded_windows + 1 if frame_load < QUALITY_UPGRADE_LOAD else 0
+
+  if overloaded_windows >= QUALITY_DOWNGRADE_WINDOWS and governed_quality_level < len(QUALITY_LEVELS) - 1:
+    set_governed_quality_level(governed_quality_level + 1, f"frame load {frame_load:.2f}")
+    return True
+  if underloaded_windows >= QUALITY_UPGRADE_WINDOWS and governed_quality_level > 0:
+    set_governed_quality_level(governed_quality_level - 1, f"frame load {frame_load:.2f}")
+    return True
+
+  return False
@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import itertools
+import json
+import random
+import struct
+import time
+
+from main_game.globals import SESSION_CHECKSUM_INTERVAL, physics_space
+from main_game.main_game import initialise_game, update_game_state
+from main_game.physics_budget import set_physics_budget_enabled
+from main_game.physics_objects import step_physics
+from main_game.quality_governor import set_governed_quality_level
+from main_game.webcam_and_pose_info import get_xflipped_points_dict_from_lines
+from pose_detection.pose_landmarks import (PoseResults,
+                                           get_points_from_pose_lines,
+                                           get_pose_results_from_players)
+
+# A session file is JSON lines (gzipped if the path ends in .gz). Frames are fixed timestep simulation ticks.
+#   {"seed": ..., "checksum_interval": ..., "version": 3}                                  header
+#   {"frame": n, "player_points": [...], "player_ids": [...], "silhouette_contours": [...]} pose input, only when it changes
+#   {"frame": n, "level": "level_x"}                                                       level transition
+#   {"frame": n, "quality": q}                                                             quality governor change, before the tick
+#   {"frame": n, "checksum": "..."}                                                        body positions after the physics step
+#   {"frames": n}                                                                          end of the session
+# Sessions recorded before multi-player support hold "pose_lines" of a single player instead of "player_points".
+# Version 1 sessions, without "version" in the header, rebuilt the game body on every frame and applied quality
+# changes just before the physics step. Sessions before version 3 ran without body sleeping or ball eviction.
+SESSION_FORMAT_VERSION = 3
+
+
+def open_session_file(path, mode):
+  if path.endswith(".gz"):
+    return gzip.open(path, mode + "t")
+  return open(path, mode)
+
+
+def get_physics_checksum():
+  # Positions are rounded, so builds that only differ by float noise still compare equal
+  checksum = hashlib.sha1()
+  for body in physics_space.bodies:
+    position_x, position_y = body.position
+    checksum.update(struct.pack("<dd", round(position_x, 3), round(position_y, 3)))
+  return checksum.hexdigest()[:16]
+
+
+class SessionRecorder:
+  def __init__(self, path, seed=None, checksum_interval=SESSION_CHECKSUM_INTERVAL):
+    self.seed = seed if seed is not None else int(time.time())
+    self.checksum_interval = checksum_interval
+    self.frame = 0
+    self.last_player_points = None
+    self.file = open_session_file(path, "w")
+
+    self.write_entry({"seed": self.seed, "checksum_interval": checksum_interval, "version": SESSION_FORMAT_VERSION})
+
+  def write_entry(self, entry):
+    self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+  def record_pose_input(self, player_points, player_ids, silhouette_contours):
+    # The pose thread hands over a new array for every detection, so unchanged input is only stored once
+    if player_points is not self.last_player_points:
+      self.write_entry({"frame": self.frame, "player_points": player_points.tolist(), "player_ids": player_ids,
+                        "silhouette_contours": silhouette_contours})
+      self.last_player_points = player_points
+
+  def record_level(self, current_level):
+    self.write_entry({"frame": self.frame, "level": current_level})
+
+  def record_quality(self, quality_level):
+    self.write_entry({"frame": self.frame, "quality": quality_level})
+
+  def end_frame(self):
+    if (self.frame + 1) % self.checksum_interval == 0:
+      self.write_entry({"frame": self.frame, "checksum": get_physics_checksum()})
+    self.frame += 1
+
+  def close(self):
+    self.write_entry({"frames": self.frame})
+    self.file.close()
+
+
+def read_session_entries(path):
+  with open_session_file(path, "r") as file:
+    for line in file:
+      yield json.loads(line)
+
+
+def replay_session(path, checksum_output_path=None):
+  """
+  Re-runs a recorded session headlessly, as fast as possible, and compares it against the recording.
+
+  :param path: The session file written by SessionRecorder.
+  :param checksum_output_path: Optional JSON lines file to write this run's checksums to, for comparing builds.
+  :return: The number of level transitions and checksums that differ from the recording.
+  """
+  entries = read_session_entries(path)
+  header = next(entries)
+  checksum_interval = header["checksum_interval"]
+  version = header.get("version", 1)
+
+  random.seed(header["seed"])
+  set_physics_budget_enabled(version >= 3)
+  gs = initialise_game()
+
+  checksum_output = open(checksum_output_path, "w") if checksum_output_path else None
+
+  pose_results = PoseResults(None, [])
+  points_dict = {}
+  mismatches = 0
+  total_frames = None
+  frame = 0
+  entry = next(entries, None)
+
+  start_time = time.perf_counter()
+
+  while True:
+    recorded_level = None
+    recorded_quality = None
+    recorded_checksum = None
+    has_new_pose = version == 1
+
+    while entry is not None and entry.get("frame") == frame:
+      if "player_points" in entry or "pose_lines" in entry:
+        if "player_points" in entry:
+          player_points, player_ids = entry["player_points"], entry["player_ids"]
+        else:
+          player_points, player_ids = ([get_points_from_pose_lines(entry["pose_lines"])], [0]) if entry["pose_lines"] else ([], [])
+        pose_results = get_pose_results_from_players(None, player_points, player_ids, entry.get("silhouette_contours", []))
+        points_dict = get_xflipped_points_dict_from_lines(pose_results.pose_lines)
+        has_new_pose = True
+      elif "level" in entry:
+        recorded_level = entry["level"]
+      elif "quality" in entry:
+        recorded_quality = entry["quality"]
+      elif "checksum" in entry:
+        recorded_checksum = entry["checksum"]
+      entry = next(entries, None)
+
+    if entry is not None and "frames" in entry:
+      total_frames = entry["frames"]
+      entry = None
+    if frame == total_frames or (entry is None and total_frames is None):
+      break
+
+    # The governor reacts to live frame times, so replay its decisions rather than re-running it
+    if recorded_quality is not None and version >= 2:
+      set_governed_quality_level(recorded_quality, "recorded")
+
+    level_changed = update_game_state(gs, pose_results.player_points, pose_results.player_ids, points_dict, pose_results.silhouette_contours, has_new_pose)
+
+    if level_changed or recorded_level:
+      replayed_level = gs.current_level if level_changed else None
+      if replayed_level != recorded_level:
+        print(f"Frame {frame}: level transition to {replayed_level}, recorded {recorded_level}")
+        mismatches += 1
+
+    if recorded_quality is not None and version == 1:
+      set_governed_quality_level(recorded_quality, "recorded")
+
+    step_physics()
+
+    if (frame + 1) % checksum_interval == 0:
+      checksum = get_physics_checksum()
+      if checksum_output:
+        checksum_output.write(json.dumps({"frame": frame, "checksum": checksum}) + "\n")
+      if recorded_checksum and checksum != recorded_checksum:
+        print(f"Frame {frame}: checksum {checksum}, recorded {recorded_checksum}")
+        mismatches += 1
+
+    frame += 1
+
+  elapsed_time = time.perf_counter() - start_time
+
+  if checksum_output:
+    checksum_output.close()
+
+  print(f"Replayed {frame} frames in {elapsed_time:.2f}s ({frame / max(elapsed_time, 1e-9):.0f} fps), {mismatches} mismatches")
+  return mismatches
+
+
+def compare_checksum_files(first_path, second_path):
+  # Returns the first frame whose checksums differ, or that only one run has a checksum for (where one run ended
+  # early), or None if the two runs agree
+  with open(first_path, "r") as first_file, open(second_path, "r") as second_file:
+    for first_line, second_line in itertools.zip_longest(first_file, second_file):
+      first_entry = json.loads(first_line) if first_line is not None else None
+      second_entry = json.loads(second_line) if second_line is not None else None
+      if first_entry != second_entry:
+        return (first_entry or second_entry)["frame"]
+  return None
@@ -0,0 +1,152 @@
+import json
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Stage:
+  name: str
+  run: callable
+  # Seconds a single run is expected to take. Runs over budget are counted, and stop a fixed rate stage catching up.
+  budget: float
+  # Seconds between runs, or None to run on every frame
+  interval: float = None
+  # Optional callable returning False when there is no new work for the stage
+  is_due: callable = None
+  # Fixed rate stages run as many times as wall time calls for, up to max_runs_per_frame
+  is_fixed_rate: bool = False
+  max_runs_per_frame: int = 1
+  accumulated_time: float = 0.0
+  last_run_time: float = None
+  # calls, total seconds, longest run in seconds, runs over budget
+  stats: list = field(default_factory=lambda: [0, 0.0, 0.0, 0])
+
+
+@dataclass
+class IdleTask:
+  name: str
+  run: callable
+  # Seconds between runs
+  interval: float
+  # Seconds after which the task runs even if no frame has time to spare, or None to only run in spare time
+  max_defer: float = None
+  is_due: callable = None
+  last_run_time: float = None
+  last_duration: float = 0.0
+  stats: list = field(default_factory=lambda: [0, 0.0, 0.0, 0])
+
+
+def record_run(stats, duration, budget=None):
+  stats[0] += 1
+  stats[1] += duration
+  stats[2] = max(stats[2], duration)
+  if budget is not None and duration > budget:
+    stats[3] += 1
+
+
+class StageScheduler:
+  """
+  Runs the main loop's stages, each at its own rate and within its own time budget, then fills whatever is left of
+  the frame budget with deferrable idle tasks, so that occasional work does not land on a single frame as a spike.
+  """
+
+  def __init__(self, frame_budget):
+    self.frame_budget = frame_budget
+    self.stages = []
+    self.idle_tasks = []
+    self.frame_start_time = None
+    # Seconds spent in stages on the last frame, excluding idle tasks
+    self.frame_work_time = 0.0
+    # name -> runs over budget at the last report
+    self.reported_over_budget = {}
+
+  def add_stage(self, name, run, budget, rate=None, is_due=None):
+    self.stages.append(Stage(name, run, budget, 1 / rate if rate else None, is_due))
+
+  def add_fixed_rate_stage(self, name, run, budget, rate, max_runs_per_frame):
+    # The first frame runs the stage once, then it runs at rate per second of wall time
+    self.stages.append(Stage(name, run, budget, 1 / rate, is_fixed_rate=True, max_runs_per_frame=max_runs_per_frame, accumulated_time=1 / rate))
+
+  def add_idle_task(self, name, run, interval, max_defer=None, is_due=None):
+    # The first run is an interval after the task is added
+    self.idle_tasks.append(IdleTask(name, run, interval, max_defer, is_due, last_run_time=time.perf_counter()))
+
+  def run_stage(self, stage, now):
+    if stage.is_fixed_rate:
+      if stage.last_run_time is not None:
+        stage.accumulated_time += now - stage.last_run_time
+      stage.last_run_time = now
+
+      runs = 0
+      stage_start_time = time.perf_counter()
+      while stage.accumulated_time >= stage.interval and runs < stage.max_runs_per_frame:
+        # A slow run should not be followed by more catching up on the same frame
+        if runs > 0 and time.perf_counter() - stage_start_time > stage.budget:
+          break
+        run_start_time = time.perf_counter()
+        stage.run()
+        record_run(stage.stats, time.perf_counter() - run_start_time, stage.budget)
+        stage.accumulated_time -= stage.interval
+        runs += 1
+
+      # Drop a backlog that could not be caught up, rather than falling further behind every frame
+      stage.accumulated_time = min(stage.accumulated_time, stage.interval)
+      return
+
+    if stage.interval is not None and stage.last_run_time is not None and now - stage.last_run_time < stage.interval:
+      return
+    if stage.is_due is not None and not stage.is_due():
+      return
+
+    stage.last_run_time = now
+    run_start_time = time.perf_counter()
+    stage.run()
+    record_run(stage.stats, time.perf_counter() - run_start_time, stage.budget)
+
+  def run_idle_tasks(self):
+    for task in self.idle_tasks:
+      now = time.perf_counter()
+      if task.last_run_time is not None and now - task.last_run_time < task.interval:
+        continue
+      if task.is_due is not None and not task.is_due():
+        continue
+
+      # Only start a task that is expected to finish within the frame, unless it has been put off for too long
+      time_left = self.frame_budget - (now - self.frame_start_time)
+      is_overdue = task.max_defer is not None and task.last_run_time is not None and now - task.last_run_time > task.max_defer
+      if time_left < task.last_duration and not is_overdue:
+        continue
+
+      task.run()
+      task.last_run_time = time.perf_counter()
+      task.last_duration = task.last_run_time - now
+      record_run(task.stats, task.last_duration, time_left)
+
+  def run_frame(self):
+    self.frame_start_time = time.perf_counter()
+    for stage in self.stages:
+      self.run_stage(stage, self.frame_start_time)
+    self.frame_work_time = time.perf_counter() - self.frame_start_time
+
+    self.run_idle_tasks()
+
+  def get_stats(self):
+    # name -> {"calls", "mean_ms", "max_ms", "over_budget"}
+    stats = {}
+    for item in self.stages + self.idle_tasks:
+      calls, total_time, max_time, over_budget = item.stats
+      stats[item.name] = {"calls": calls, "mean_ms": round(total_time / max(calls, 1) * 1000, 3), "max_ms": round(max_time * 1000, 3), "over_budget": over_budget}
+    return stats
+
+  def report_stats(self, path=None):
+    # Prints the stages that went over budget since the last report, and writes all stats to path if given
+    stats = self.get_stats()
+    for stage in self.stages:
+      over_budget = stats[stage.name]["over_budget"] - self.reported_over_budget.get(stage.name, 0)
+      if over_budget:
+        print(f"[schedule] {stage.name} over its {stage.budget * 1000:.1f} ms budget {over_budget} times (max {stats[stage.name]['max_ms']:.1f} ms)")
+      self.reported_over_budget[stage.name] = stats[stage.name]["over_budget"]
+
+    if path:
+      with open(path, 'w') as file:
+        json.dump(stats, file, indent=2)
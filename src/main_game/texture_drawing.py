@@ -0,0 +1,195 @@
+import math
+
+import pygame
+from pygame._sdl2.video import Texture
+
+from main_game.drawing import (draw_background, draw_physics_flag,
+                               draw_physics_line, get_hud_surface,
+                               get_player_colour, lvl_to_title)
+from main_game.globals import (BALL_RADIUS, DEBUG_MODE, GAME_BODY_TTL_MAX,
+                               PHYSICS_TO_SCREEN_SCALE_X,
+                               PHYSICS_TO_SCREEN_SCALE_Y, WebcamInfo,
+                               level_data, physics_POS_to_screen_POS_xy,
+                               render_screen, sdl2_renderer)
+from main_game.webcam_and_pose_info import (FloatRect,
+                                            screen_REL_to_screen_ABS,
+                                            uncropped_webcam_REL_to_screen_ABS)
+
+# The same frame as main_game.drawing, drawn through an SDL2 Renderer. Anything that does not move within a level
+# is drawn once with the surface renderer and uploaded as a texture: the background below the webcam preview and
+# balls, and the flag and level lines above them, so both backends layer the frame the same way. The webcam preview is streamed into a texture
+# that is reused for as long as its size stays the same, and primitives are drawn in batches of one colour.
+
+HEAD_OUTLINE_SEGMENTS = 32
+GRID_OUTLINE_WIDTH = 3
+# Fills the static foreground layer where nothing is drawn, and is made transparent when it is uploaded
+FOREGROUND_COLOUR_KEY = (255, 0, 255)
+
+# (background images the layers were drawn for, background texture, foreground texture)
+static_layer_cache = None, None, None
+# (webcam surface last uploaded, texture)
+webcam_texture_cache = None, None
+ball_texture = None
+# (text, colour) -> texture
+text_texture_cache = {}
+# (HUD surface last uploaded, texture)
+hud_texture_cache = None, None
+
+
+def get_static_layer_textures(bg_images, level_lines, flag):
+  # The background, level lines and flag only change with the level. load_level loads new background images for
+  # every level, so they identify the level that was drawn.
+  global static_layer_cache
+
+  cached_bg_images, background_texture, foreground_texture = static_layer_cache
+  if bg_images is not cached_bg_images:
+    draw_background(bg_images)
+    background_texture = Texture.from_surface(sdl2_renderer, render_screen)
+
+    render_screen.fill(FOREGROUND_COLOUR_KEY)
+    draw_physics_flag(flag)
+    for line in level_lines:
+      draw_physics_line(line)
+    foreground_surface = render_screen.copy()
+    foreground_surface.set_colorkey(FOREGROUND_COLOUR_KEY)
+    foreground_texture = Texture.from_surface(sdl2_renderer, foreground_surface)
+
+    static_layer_cache = bg_images, background_texture, foreground_texture
+
+  return background_texture, foreground_texture
+
+
+def get_webcam_texture(webcam_info: WebcamInfo):
+  global webcam_texture_cache
+
+  cached_surface, texture = webcam_texture_cache
+  webcam_surface = webcam_info.webcam_surface_rescaled
+  if webcam_surface is not cached_surface:
+    if texture is None or (texture.width, texture.height) != webcam_surface.get_size():
+      texture = Texture(sdl2_renderer, webcam_surface.get_size(), streaming=True)
+    texture.update(webcam_surface)
+    webcam_texture_cache = webcam_surface, texture
+
+  return texture
+
+
+def get_ball_texture():
+  global ball_texture
+
+  if ball_texture is None:
+    radius = math.ceil(BALL_RADIUS * PHYSICS_TO_SCREEN_SCALE_X)
+    ball_surface = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
+    pygame.draw.circle(ball_surface, "blue", (radius, radius), radius)
+    ball_texture = Texture.from_surface(sdl2_renderer, ball_surface)
+
+  return ball_texture
+
+
+def get_text_texture(text, render_font, colour=(0, 0, 0)):
+  if (text, colour) not in text_texture_cache:
+    text_texture_cache[(text, colour)] = Texture.from_surface(sdl2_renderer, render_font.render(text, True, colour))
+  return text_texture_cache[(text, colour)]
+
+
+def get_hud_texture():
+  global hud_texture_cache
+
+  cached_hud_surface, texture = hud_texture_cache
+  hud_surface = get_hud_surface()
+  if hud_surface is not cached_hud_surface:
+    texture = Texture.from_surface(sdl2_renderer, hud_surface) if hud_surface else None
+    hud_texture_cache = hud_surface, texture
+
+  return texture
+
+
+def draw_line_batches(line_batches):
+  # line_batches maps a colour to the (start, end) screen positions to draw in it, so the draw colour
+  # only changes once per colour
+  for colour, lines in line_batches.items():
+    sdl2_renderer.draw_color = pygame.Color(colour)
+    for start_position, end_position in lines:
+      sdl2_renderer.draw_line(start_position, end_position)
+
+
+def get_physics_line_positions(line):
+  line_shape, _ = line
+  return physics_POS_to_screen_POS_xy(line_shape.a), physics_POS_to_screen_POS_xy(line_shape.b)
+
+
+def get_ellipse_outline(position, width, height):
+  position_x, position_y = physics_POS_to_screen_POS_xy(position)
+  radius_x, radius_y = width * PHYSICS_TO_SCREEN_SCALE_X / 2, height * PHYSICS_TO_SCREEN_SCALE_Y / 2
+  points = [(position_x + radius_x * math.cos(2 * math.pi * n / HEAD_OUTLINE_SEGMENTS), position_y + radius_y * math.sin(2 * math.pi * n / HEAD_OUTLINE_SEGMENTS))
+            for n in range(HEAD_OUTLINE_SEGMENTS)]
+  return list(zip(points, points[1:] + points[:1]))
+
+
+def draw_outline_rect(rect, colour, width=GRID_OUTLINE_WIDTH):
+  sdl2_renderer.draw_color = pygame.Color(colour)
+  rect = pygame.Rect(rect)
+  for inset in range(width):
+    sdl2_renderer.draw_rect(rect.inflate(-2 * inset, -2 * inset))
+
+
+def draw_rectangles(webcam_info: WebcamInfo, grids):
+  if not (webcam_info.webcam_surface_rescaled is None):
+      if DEBUG_MODE:
+        draw_outline_rect(uncropped_webcam_REL_to_screen_ABS(webcam_info, FloatRect().from_xywh(0, 0, 1, 1)), [255, 255, 0])
+
+      for gamegrid_rect_screen_REL, camgrid_rect_webcam_REL, colour in grids:
+        draw_outline_rect(uncropped_webcam_REL_to_screen_ABS(webcam_info, FloatRect().from_xywh(*camgrid_rect_webcam_REL)), colour)
+        draw_outline_rect(screen_REL_to_screen_ABS(FloatRect().from_xywh(*gamegrid_rect_screen_REL)), colour)
+
+
+def draw_webcam(wc: WebcamInfo):
+    cropped_area = pygame.Rect(
+        (wc.webcam_rect_rescaled_ABS.width - wc.target_rect_ABS.width) / 2,  # left
+        (wc.webcam_rect_rescaled_ABS.height - wc.target_rect_ABS.height) / 2,  # top
+        wc.target_rect_ABS.width,  # width
+        wc.target_rect_ABS.height)  # height
+
+    get_webcam_texture(wc).draw(srcrect=cropped_area, dstrect=wc.target_rect_ABS)
+
+    if DEBUG_MODE:
+      draw_outline_rect(wc.target_rect_ABS, "red")
+      draw_outline_rect(wc.webcam_rect_rescaled_ABS, "blue")
+      draw_outline_rect(cropped_area.move(wc.target_rect_ABS.topleft), "green")
+
+
+def draw_game(bg_images, current_level, balls, flag, webcam_info: WebcamInfo, level_lines, game_limbs, game_heads, silhouette_lines, grids, text, screen_width, screen_height, render_font):
+  background_texture, foreground_texture = get_static_layer_textures(bg_images, level_lines, flag)
+  background_texture.draw()
+
+  if not (webcam_info.raw_image is None):
+    draw_webcam(webcam_info)
+
+  if level_data[current_level]["spawn_balls"]:
+    ball_texture = get_ball_texture()
+    for ball_shape, ball_body in balls:
+      position_x, position_y = physics_POS_to_screen_POS_xy(ball_body.position)
+      ball_texture.draw(dstrect=(position_x - ball_texture.width / 2, position_y - ball_texture.height / 2, ball_texture.width, ball_texture.height))
+
+  foreground_texture.draw()
+
+  line_batches = {"black": [get_physics_line_positions(line) for line in silhouette_lines]}
+  for line, ttl, player_id in game_limbs:
+    if ttl == GAME_BODY_TTL_MAX:
+      line_batches.setdefault(get_player_colour(current_level, player_id), []).append(get_physics_line_positions(line))
+  for _, head_pos, head_width, head_height, _, player_id in game_heads:
+    line_batches.setdefault(get_player_colour(current_level, player_id), []).extend(get_ellipse_outline(head_pos, head_width, head_height))
+  draw_line_batches(line_batches)
+
+  if not (webcam_info.webcam_surface_rescaled is None):
+    draw_rectangles(webcam_info, grids)
+
+  get_text_texture(lvl_to_title(current_level), render_font).draw(dstrect=(0, 0))
+
+  hud_texture = get_hud_texture()
+  if hud_texture:
+    hud_texture.draw(dstrect=(0, screen_height - hud_texture.height))
+
+  # Print instruction text
+  if not (webcam_info.webcam_rect_rescaled_ABS is None) and text:
+    text_texture = get_text_texture(text, render_font)
+    text_texture.draw(dstrect=(webcam_info.target_rect_ABS.left + 20, webcam_info.target_rect_ABS.bottom + 20))
@@ -1,11 +1,14 @@
-import math
-
 import numpy as np
 import pygame
 
 from main_game.globals import (WebcamInfo, level_data, render_screen,
                                screen_height, screen_REL_to_screen_POS_xy,
                                screen_width)
+from main_game.quality_governor import get_quality_setting
+from pose_detection.pose_landmarks import POSE_LANDMARK_COUNT
+
+# (webcam image, level, webcam info, frames since the webcam info was last rebuilt)
+webcam_info_cache = None, None, WebcamInfo(None, None, None, None, None), 0
 
 
 class FloatRect:
@@ -37,13 +40,13 @@ class FloatRect:
       
 
 def get_webcam_and_pose_info(get_pose_results_callback, current_level):
-    webcam_img, pose_lines = get_pose_results_callback()
-    points_dict = get_xflipped_points_dict_from_lines(pose_lines)
+    pose_results = get_pose_results_callback()
 
-    webcam_info = get_webcam_info(webcam_img, current_level)
-    head_width, head_height, head_pos = get_head_info(points_dict)
+    webcam_info = get_cached_webcam_info(pose_results.image, current_level)
+    # Gestures, like raising both arms on level_0, are only read from the first player
+    points_dict = get_xflipped_points_dict_from_lines(pose_results.pose_lines)
 
-    return webcam_info, head_width, head_height, head_pos, pose_lines, points_dict
+    return webcam_info, points_dict, pose_results
 
 def screen_REL_to_screen_ABS(rect_REL: FloatRect):
     target_top_left_ABS = screen_REL_to_screen_POS_xy(tuple(rect_REL.topleft))
@@ -69,10 +72,26 @@ def uncropped_webcam_REL_to_screen_ABS(wc: WebcamInfo, rect_REL: FloatRect):
     target_height_ABS = rect_REL.height * uncropped_area_ABS.height
     return pygame.Rect(target_top_left_ABS, (target_width_ABS, target_height_ABS))
 
+def get_cached_webcam_info(webcam_img, current_level):
+    # The preview is only rebuilt for a new camera frame, and no more often than the quality level allows
+    global webcam_info_cache
+
+    cached_webcam_img, cached_level, cached_webcam_info, frames_since_update = webcam_info_cache
+    is_update_due = frames_since_update + 1 >= get_quality_setting("webcam_update_interval")
+
+    if current_level != cached_level or (webcam_img is not cached_webcam_img and is_update_due):
+        webcam_info_cache = webcam_img, current_level, get_webcam_info(webcam_img, current_level), 0
+    else:
+        webcam_info_cache = cached_webcam_img, cached_level, cached_webcam_info, frames_since_update + 1
+
+    return webcam_info_cache[2]
+
 def get_webcam_info(webcam_img, current_level):
     if webcam_img is None: return WebcamInfo(None, None, None, None, None)
 
-    webcam_pose_arr = np.array(webcam_img)
+    # Sample every n-th pixel at lower quality levels, as the preview is upscaled to fill its rect anyway
+    webcam_preview_step = get_quality_setting("webcam_preview_step")
+    webcam_pose_arr = np.asarray(webcam_img)[::webcam_preview_step, ::webcam_preview_step]
     # For some reason the image is rotated 90 degrees
     webcam_pose_arr = np.rot90(webcam_pose_arr)
     webcam_pose_image_surface = pygame.surfarray.make_surface(webcam_pose_arr)
@@ -107,25 +126,19 @@ def get_xflipped_points_dict_from_lines(pose_lines):
         points_dict[c2] = (1 - end_position_x, end_position_y)
     return points_dict
 
-def get_head_info(points_dict):
-    # Assuming the points for head and head height are available in points_dict
-    # and using the identifiers 8, 7 for head width, and 4, 10 for head height calculation
-    
-    # Calculate head position and width
-    if 8 in points_dict and 7 in points_dict:
-        start_position, end_position = points_dict[8], points_dict[7]
-        head_pos = ((start_position[0] + end_position[0]) / 2, (start_position[1] + end_position[1]) / 2)
-        head_width = math.sqrt((start_position[0] - end_position[0]) ** 2 + (start_position[1] - end_position[1]) ** 2)
-    else:
-        head_pos = (None, None)
-        head_width = None
+def get_players_head_info(player_points):
+    # Head widths, heights and positions of every player at once, from the same landmarks as before:
+    # 8 and 7 (the ears) for the head width and position, and 4 and 10 for the head height.
+    # Missing landmarks are NaN, which gives a NaN head.
+    xflipped_points = np.array(player_points, dtype=np.float64).reshape(-1, POSE_LANDMARK_COUNT, 2)
+    xflipped_points[:, :, 0] = 1 - xflipped_points[:, :, 0]
 
-    # Calculate head height
-    if 4 in points_dict and 10 in points_dict:
-        start_position, end_position = points_dict[4], points_dict[10]
-        head_height = 3 * math.sqrt((start_position[0] - end_position[0]) ** 2 + (start_position[1] - end_position[1]) ** 2)
-    else:
-        head_height = None
+    start_positions, end_positions = xflipped_points[:, 8], xflipped_points[:, 7]
+    head_pos = (start_positions + end_positions) / 2
+    head_width = np.sqrt((start_positions[:, 0] - end_positions[:, 0]) ** 2 + (start_positions[:, 1] - end_positions[:, 1]) ** 2)
+
+    start_positions, end_positions = xflipped_points[:, 4], xflipped_points[:, 10]
+    head_height = 3 * np.sqrt((start_positions[:, 0] - end_positions[:, 0]) ** 2 + (start_positions[:, 1] - end_positions[:, 1]) ** 2)
 
     return head_width, head_height, head_pos
 
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Capture settings are read from a JSON file, any of which can be left out (or null) to keep the driver's default:
+#   "source"           camera device index, path to a video file, or "synthetic" for generated frames
+#   "backend"          one of CAPTURE_BACKENDS, e.g. "v4l2" or "dshow"
+#   "width", "height"  requested frame size in pixels
+#   "fourcc"           requested pixel format, e.g. "MJPG" rather than the YUYV many USB cameras default to
+#   "fps"              requested frame rate
+#   "buffer_size"      frames the driver queues, where 1 keeps the newest frame the only one waiting
+#   "threaded_decode"  read and decode frames on their own thread, handing over only the newest
+#   "loop"             start a video file again when it ends
+# Cameras do not have to accept a request, so the settings actually negotiated are reported when a source opens.
+CAMERA_CONFIG_PATH = "pose_detection/camera.json"
+DEFAULT_CAMERA_CONFIG = {
+  "source": 0,
+  "backend": "any",
+  "width": None,
+  "height": None,
+  "fourcc": None,
+  "fps": None,
+  "buffer_size": None,
+  "threaded_decode": False,
+  "loop": True,
+}
+CAPTURE_BACKENDS = {
+  "any": cv2.CAP_ANY,
+  "v4l2": cv2.CAP_V4L2,
+  "dshow": cv2.CAP_DSHOW,
+  "msmf": cv2.CAP_MSMF,
+  "avfoundation": cv2.CAP_AVFOUNDATION,
+  "gstreamer": cv2.CAP_GSTREAMER,
+  "ffmpeg": cv2.CAP_FFMPEG,
+}
+SYNTHETIC_SOURCE = "synthetic"
+SYNTHETIC_FRAME_SIZE = (640, 480)
+DEFAULT_CAPTURE_FPS = 30
+# Seconds to wait before trying a camera again after it failed to return a frame
+CAPTURE_RETRY_DELAY = 0.1
+
+
+def load_camera_config(config_path=CAMERA_CONFIG_PATH):
+  """
+  Reads capture settings, filling in defaults for any that are missing.
+
+  :param config_path: JSON file of settings. If it does not exist, every setting keeps its default.
+  :return: A dict with every key of DEFAULT_CAMERA_CONFIG.
+  """
+  camera_config = dict(DEFAULT_CAMERA_CONFIG)
+  if config_path and os.path.exists(config_path):
+    with open(config_path, 'r') as file:
+      camera_config.update(json.load(file))
+
+  unknown_keys = set(camera_config) - set(DEFAULT_CAMERA_CONFIG)
+  if unknown_keys:
+    raise ValueError(f"Unknown camera settings in {config_path}: {', '.join(sorted(unknown_keys))}")
+  if camera_config["backend"] not in CAPTURE_BACKENDS:
+    raise ValueError(f"Unknown capture backend {camera_config['backend']!r}, expected one of {', '.join(CAPTURE_BACKENDS)}")
+  if camera_config["fourcc"] is not None and len(camera_config["fourcc"]) != 4:
+    raise ValueError(f"FOURCC must be four characters, got {camera_config['fourcc']!r}")
+
+  return camera_config
+
+
+def fourcc_to_string(fourcc):
+  fourcc = int(fourcc)
+  return "".join(chr((fourcc >> (8 * n)) & 0xFF) for n in range(4)) if fourcc > 0 else None
+
+
+class VideoCaptureSource:
+  """
+  A camera or video file opened through cv2.VideoCapture, with the requested capture settings applied.
+  """
+
+  def __init__(self, camera_config):
+    self.source = camera_config["source"]
+    self.is_file = not isinstance(self.source, int)
+    # A video file has its own frame size, format and rate, so only a camera negotiates the requested settings
+    self.negotiated_settings = [] if self.is_file else ["width", "height", "fourcc", "fps", "buffer_size"]
+    self.loop = camera_config["loop"]
+    # Set once a video file has run out of frames and is not looped
+    self.is_ended = False
+    self.cap = cv2.VideoCapture(self.source, CAPTURE_BACKENDS[camera_config["backend"]])
+    if not self.cap.isOpened():
+      raise RuntimeError(f"Could not open capture source {self.source!r}")
+
+    # The pixel format has to be set first, as it limits which sizes and rates the camera offers
+    if camera_config["fourcc"]:
+      self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*camera_config["fourcc"]))
+    if camera_config["width"]:
+      self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, camera_config["width"])
+    if camera_config["height"]:
+      self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, camera_config["height"])
+    if camera_config["fps"]:
+      self.cap.set(cv2.CAP_PROP_FPS, camera_config["fps"])
+    if camera_config["buffer_size"]:
+      self.cap.set(cv2.CAP_PROP_BUFFERSIZE, camera_config["buffer_size"])
+
+    self.fps = self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_CAPTURE_FPS
+    self.next_frame_time = time.perf_counter()
+
+  def read(self):
+    # Video files are read at their own frame rate, as a camera would deliver them
+    if self.is_file:
+      time.sleep(max(0.0, self.next_frame_time - time.perf_counter()))
+      self.next_frame_time = max(self.next_frame_time, time.perf_counter() - 1 / self.fps) + 1 / self.fps
+
+    ret, frame = self.cap.read()
+    if not ret and self.is_file and self.loop:
+      self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+      ret, frame = self.cap.read()
+
+    if not ret:
+      if self.is_file:
+        self.is_ended = True
+      else:
+        # A camera that stops delivering frames is retried, without spinning on it
+        time.sleep(CAPTURE_RETRY_DELAY)
+    return ret, frame
+
+  def get_settings(self):
+    return {
+      "source": self.source,
+      "backend": self.cap.getBackendName(),
+      "width": int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+      "height": int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+      "fourcc": fourcc_to_string(self.cap.get(cv2.CAP_PROP_FOURCC)),
+      "fps": self.cap.get(cv2.CAP_PROP_FPS),
+      "buffer_size": int(self.cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+  def release(self):
+    self.cap.release()
+
+
+class SyntheticSource:
+  """
+  Generated frames of a bar sweeping across a gradient, delivered at the requested frame rate, so capture and
+  detection can be run without a camera.
+  """
+
+  def __init__(self, camera_config):
+    self.width = camera_config["width"] or SYNTHETIC_FRAME_SIZE[0]
+    self.height = camera_config["height"] or SYNTHETIC_FRAME_SIZE[1]
+    self.fps = camera_config["fps"] or DEFAULT_CAPTURE_FPS
+    self.negotiated_settings = ["width", "height", "fps"]
+    self.background = np.repeat(np.linspace(0, 255, self.width, dtype=np.uint8)[np.newaxis, :, np.newaxis], self.height, axis=0).repeat(3, axis=2)
+    self.frame_count = 0
+    self.is_ended = False
+    self.next_frame_time = time.perf_counter()
+
+  def read(self):
+    time.sleep(max(0.0, self.next_frame_time - time.perf_counter()))
+    self.next_frame_time = max(self.next_frame_time, time.perf_counter() - 1 / self.fps) + 1 / self.fps
+
+    frame = self.background.copy()
+    bar_x = self.frame_count * 8 % self.width
+    frame[:, bar_x:bar_x + 16] = 255
+    cv2.putText(frame, str(self.frame_count), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    self.frame_count += 1
+    return True, frame
+
+  def get_settings(self):
+    return {"source": SYNTHETIC_SOURCE, "backend": SYNTHETIC_SOURCE, "width": self.width, "height": self.height, "fourcc": None, "fps": self.fps, "buffer_size": 1}
+
+  def release(self):
+    pass
+
+
+class ThreadedCapture:
+  """
+  Reads and decodes frames from a source on a thread of its own, so decoding (MJPG in particular) is not on the
+  detector's thread. Only the newest frame is kept: a frame the detector was too busy to take is dropped, rather
+  than queued up to add latency.
+  """
+
+  def __init__(self, source):
+    self.source = source
+    self.fps = source.fps
+    self.frame = None
+    self.dropped_frames = 0
+    self.is_running = True
+    self.is_source_ended = False
+    self.frame_ready = threading.Condition()
+    self.thread = threading.Thread(daemon=True, target=self.read_frames)
+    self.thread.start()
+
+  def read_frames(self):
+    while self.is_running:
+      ret, frame = self.source.read()
+      if not ret:
+        if self.source.is_ended:
+          # Wake the reader, which would otherwise wait for a frame that never comes
+          with self.frame_ready:
+            self.is_source_ended = True
+            self.frame_ready.notify_all()
+          return
+        continue
+      with self.frame_ready:
+        if self.frame is not None:
+          self.dropped_frames += 1
+        self.frame = frame
+        self.frame_ready.notify()
+
+  def read(self):
+    with self.frame_ready:
+      while self.frame is None and self.is_running and not self.is_source_ended:
+        self.frame_ready.wait()
+      frame, self.frame = self.frame, None
+    return frame is not None, frame
+
+  @property
+  def is_ended(self):
+    # The last frame is still handed over after the source ends
+    return self.is_source_ended and self.frame is None
+
+  @property
+  def negotiated_settings(self):
+    return self.source.negotiated_settings
+
+  def get_settings(self):
+    return dict(self.source.get_settings(), threaded_decode=True)
+
+  def release(self):
+    with self.frame_ready:
+      self.is_running = False
+      self.frame_ready.notify_all()
+    self.thread.join()
+    self.source.release()
+
+
+def report_capture_settings(camera_config, settings, negotiated_settings):
+  # Only settings the source actually negotiates are compared, so a mismatch is a request the camera turned down
+  print(f"[camera] {', '.join(f'{name}={value}' for name, value in settings.items())}")
+  for name in negotiated_settings:
+    if camera_config[name] is not None and camera_config[name] != settings[name]:
+      print(f"[camera] requested {name}={camera_config[name]}, but the source gave {settings[name]}")
+
+
+def open_camera(camera_config):
+  """
+  Opens the configured source and reports the settings it accepted.
+
+  :param camera_config: Settings from load_camera_config.
+  :return: A capture with read() -> (ret, frame), get_settings(), release(), fps, and is_ended for a video file
+           that has run out of frames.
+  """
+  if camera_config["source"] == SYNTHETIC_SOURCE:
+    camera = SyntheticSource(camera_config)
+  else:
+    camera = VideoCaptureSource(camera_config)
+
+  report_capture_settings(camera_config, camera.get_settings(), camera.negotiated_settings)
+
+  if camera_config["threaded_decode"]:
+    camera = ThreadedCapture(camera)
+  return camera
+
+
+def parse_source(source):
+  # Device indices are given on the command line as digits
+  return int(source) if source.isdigit() else source
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Open the configured capture source, report the settings it negotiated and how fast frames arrive.")
+  parser.add_argument("--config", default=CAMERA_CONFIG_PATH, help="JSON file of capture settings")
+  parser.add_argument("--source", default=None, help="override the configured source: a device index, video file or 'synthetic'")
+  parser.add_argument("--frames", type=int, default=120, help="number of frames to read")
+  args = parser.parse_args()
+
+  camera_config = load_camera_config(args.config)
+  if args.source is not None:
+    camera_config["source"] = parse_source(args.source)
+
+  camera = open_camera(camera_config)
+  start_time = time.perf_counter()
+  longest_wait = 0.0
+  frames_read = 0
+  while frames_read < args.frames and not camera.is_ended:
+    read_start_time = time.perf_counter()
+    ret, _ = camera.read()
+    longest_wait = max(longest_wait, time.perf_counter() - read_start_time)
+    frames_read += ret
+  elapsed_time = time.perf_counter() - start_time
+
+  print(f"[camera] read {frames_read} frames in {elapsed_time:.2f}s ({frames_read / elapsed_time:.1f} fps), longest wait {longest_wait * 1000:.1f} ms"
+        + (f", {camera.dropped_frames} dropped" if isinstance(camera, ThreadedCapture) else ""))
+  camera.release()
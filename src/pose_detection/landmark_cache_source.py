@@ -0,0 +1,65 @@
+import time
+
+import cv2
+import numpy as np
+
+from pose_detection.pose_landmarks import get_pose_results_from_players
+
+# Each cache is a pair of .npy files, which can be memory-mapped with np.load(mmap_mode='r'), holding a single player:
+#   <clip>.landmarks.npy   float32, frames x 33 x 4 (x, y, z, visibility), NaN for frames with no pose
+#   <clip>.timestamps.npy  int64, frames, in milliseconds from the start of the clip
+LANDMARKS_CACHE_SUFFIX = ".landmarks.npy"
+TIMESTAMPS_CACHE_SUFFIX = ".timestamps.npy"
+BLANK_FRAME_SHAPE = (480, 640, 3)
+
+
+def load_landmark_cache(landmarks_path):
+  # Memory-map the landmarks, so long clips are not read into memory up front
+  landmarks = np.load(landmarks_path, mmap_mode='r')
+  timestamps = np.load(landmarks_path[:-len(LANDMARKS_CACHE_SUFFIX)] + TIMESTAMPS_CACHE_SUFFIX)
+  return landmarks, timestamps
+
+
+def start_landmark_cache_replay(set_pose_results_callback, landmarks_path, video_path=None, frame_requests=None, loop=True):
+  """
+  Replays a landmark cache as pose results, in real time by the cache's timestamps.
+
+  :param frame_requests: A threading.Semaphore released once for every frame wanted, to replay the cache at the pace
+                         it is consumed (e.g. one frame per simulation tick) rather than in real time.
+  """
+  landmarks, timestamps = load_landmark_cache(landmarks_path)
+
+  cap = None
+  if video_path:
+    cap = cv2.VideoCapture(video_path)
+
+  blank_frame = np.full(BLANK_FRAME_SHAPE, 127, dtype=np.uint8)
+
+  while True:
+    start_time = time.perf_counter()
+
+    for frame_landmarks, timestamp in zip(landmarks, timestamps):
+      frame = blank_frame
+      if cap:
+        ret, video_frame = cap.read()
+        if ret:
+          frame = cv2.cvtColor(video_frame, cv2.COLOR_BGR2RGB)
+
+      if frame_requests:
+        frame_requests.acquire()
+      else:
+        delay = (timestamp - timestamps[0]) / 1000 - (time.perf_counter() - start_time)
+        if delay > 0:
+          time.sleep(delay)
+
+      # Like the live detector, keep the previous results for frames with no pose
+      if not np.isnan(frame_landmarks[0, 0]):
+        set_pose_results_callback(get_pose_results_from_players(frame, frame_landmarks[np.newaxis, :, :2], [0]))
+
+    if not loop:
+      break
+    if cap:
+      cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+  if cap:
+    cap.release()
@@ -0,0 +1,98 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from pose_detection.landmark_cache_source import (LANDMARKS_CACHE_SUFFIX,
+                                                  TIMESTAMPS_CACHE_SUFFIX)
+from pose_detection.pose_detection import (POSE_DETECTION_MODEL_ASSET_PATH,
+                                           BaseOptions, PoseLandmarker,
+                                           PoseLandmarkerOptions,
+                                           VisionRunningMode)
+
+VIDEO_FILE_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+NUM_POSE_LANDMARKS = 33
+
+
+def get_cache_paths(output_dir, video_path):
+  clip_name = os.path.splitext(os.path.basename(video_path))[0]
+  return os.path.join(output_dir, clip_name + LANDMARKS_CACHE_SUFFIX), os.path.join(output_dir, clip_name + TIMESTAMPS_CACHE_SUFFIX)
+
+
+def extract_video_landmarks(video_path, output_dir):
+  landmarks_path, timestamps_path = get_cache_paths(output_dir, video_path)
+
+  options = PoseLandmarkerOptions(
+      base_options=BaseOptions(model_asset_path=POSE_DETECTION_MODEL_ASSET_PATH),
+      running_mode=VisionRunningMode.VIDEO)
+
+  cap = cv2.VideoCapture(video_path)
+  fps = cap.get(cv2.CAP_PROP_FPS) or 30
+
+  landmarks_list = []
+  timestamps_list = []
+
+  with PoseLandmarker.create_from_options(options) as detector:
+    frame_index = 0
+    while True:
+      ret, frame = cap.read()
+
+      if not ret:
+        break
+
+      # VIDEO mode needs strictly increasing timestamps, which CAP_PROP_POS_MSEC does not guarantee
+      timestamp = int(frame_index * 1000 / fps)
+      frame_index += 1
+
+      # Frames are passed exactly as the live webcam path does, so cached landmarks match live play
+      mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
+      result = detector.detect_for_video(mp_image, timestamp)
+
+      frame_landmarks = np.full((NUM_POSE_LANDMARKS, 4), np.nan, dtype=np.float32)
+      if result.pose_landmarks:
+        frame_landmarks[:] = [(landmark.x, landmark.y, landmark.z, landmark.visibility) for landmark in result.pose_landmarks[0]]
+
+      landmarks_list.append(frame_landmarks)
+      timestamps_list.append(timestamp)
+
+  cap.release()
+
+  landmarks = np.array(landmarks_list, dtype=np.float32).reshape(-1, NUM_POSE_LANDMARKS, 4)
+  np.save(landmarks_path, landmarks)
+  np.save(timestamps_path, np.array(timestamps_list, dtype=np.int64))
+
+  return video_path, len(landmarks)
+
+
+def is_cache_up_to_date(video_path, output_dir):
+  landmarks_path, timestamps_path = get_cache_paths(output_dir, video_path)
+  if not (os.path.exists(landmarks_path) and os.path.exists(timestamps_path)):
+    return False
+  return min(os.path.getmtime(landmarks_path), os.path.getmtime(timestamps_path)) >= os.path.getmtime(video_path)
+
+
+def extract_directory_landmarks(input_dir, output_dir, workers=None, overwrite=False):
+  os.makedirs(output_dir, exist_ok=True)
+
+  video_paths = sorted(os.path.join(input_dir, file_name) for file_name in os.listdir(input_dir) if file_name.lower().endswith(VIDEO_FILE_EXTENSIONS))
+  if not overwrite:
+    video_paths = [video_path for video_path in video_paths if not is_cache_up_to_date(video_path, output_dir)]
+
+  # Each worker process runs its own landmarker over whole clips
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    for video_path, frame_count in executor.map(extract_video_landmarks, video_paths, [output_dir] * len(video_paths)):
+      print(f"{video_path}: {frame_count} frames")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Extract pose landmarks from a directory of recorded play sessions.")
+  parser.add_argument("input_dir", help="directory of video files")
+  parser.add_argument("output_dir", help="directory to write the landmark caches to")
+  parser.add_argument("--workers", type=int, default=None, help="number of worker processes (defaults to the number of cores)")
+  parser.add_argument("--overwrite", action="store_true", help="re-extract clips whose caches are already up to date")
+  args = parser.parse_args()
+
+  extract_directory_landmarks(args.input_dir, args.output_dir, args.workers, args.overwrite)
@@ -0,0 +1,52 @@
+import numpy as np
+
+# Landmarks averaged to place a player: both shoulders and both hips, which the landmarker tracks most steadily
+PLAYER_CENTRE_LANDMARKS = [11, 12, 23, 24]
+PLAYER_TRACKING_MAX_DISTANCE = 0.2
+PLAYER_TRACKING_LOST_FRAMES = 15
+
+
+class PlayerTracker:
+  """
+  Gives each detected pose a player ID that stays the same from frame to frame, by matching poses to the nearest
+  player centre of the previous frames. IDs are the lowest free player numbers, so they can index per-player
+  settings in levels.json, and a player that briefly drops out of detection keeps their ID.
+  """
+
+  def __init__(self, max_distance=PLAYER_TRACKING_MAX_DISTANCE, lost_frames=PLAYER_TRACKING_LOST_FRAMES):
+    self.max_distance = max_distance
+    self.lost_frames = lost_frames
+    # player ID -> (last centre, frames since that player was last detected)
+    self.players = {}
+
+  def assign_player_ids(self, player_points):
+    """
+    Matches this frame's poses to tracked players.
+
+    :param player_points: A players x 33 x (x, y) array of normalised landmarks, in detection order.
+    :return: The poses reordered by player ID, and the list of those IDs.
+    """
+    centres = player_points[:, PLAYER_CENTRE_LANDMARKS].mean(axis=1)
+    tracked_ids = list(self.players)
+    tracked_centres = np.array([self.players[player_id][0] for player_id in tracked_ids]).reshape(-1, 2)
+
+    # Greedily pair the closest pose and tracked player first
+    distances = np.linalg.norm(centres[:, np.newaxis] - tracked_centres[np.newaxis], axis=2)
+    pose_ids = [None] * len(player_points)
+    for pose_index, tracked_index in zip(*np.unravel_index(np.argsort(distances, axis=None), distances.shape)):
+      if distances[pose_index, tracked_index] > self.max_distance:
+        break
+      if pose_ids[pose_index] is None and tracked_ids[tracked_index] not in pose_ids:
+        pose_ids[pose_index] = tracked_ids[tracked_index]
+
+    for pose_index, player_id in enumerate(pose_ids):
+      if player_id is None:
+        player_id = next(new_id for new_id in range(len(self.players) + len(pose_ids)) if new_id not in self.players and new_id not in pose_ids)
+        pose_ids[pose_index] = player_id
+
+    self.players = {player_id: (centre, frames_lost + 1) for player_id, (centre, frames_lost) in self.players.items() if frames_lost < self.lost_frames}
+    for player_id, centre in zip(pose_ids, centres):
+      self.players[player_id] = (centre, 0)
+
+    order = np.argsort(pose_ids)
+    return player_points[order], [pose_ids[pose_index] for pose_index in order]
@@ -5,14 +5,21 @@ import mediapipe as mp
 import cv2
 import time
 
+from pose_detection.camera_capture import (CAMERA_CONFIG_PATH,
+                                           load_camera_config, open_camera)
+from pose_detection.player_tracking import PlayerTracker
+from pose_detection.pose_landmarks import get_pose_results_from_players
+from pose_detection.silhouette_contours import (EXTRACT_SILHOUETTE_CONTOURS,
+                                                get_silhouette_contours)
+
 global set_pose_results_callback_global
+global get_silhouette_enabled_callback_global
 
 POSE_DETECTION_MODEL_ASSET_PATH = "pose_detection/model/pose_landmarker.task"
+NUM_POSES = 2
 previous_detection_results = None, []
 results_validity_countdown = 5
-
-connected_landmarks = [(20, 4), (19, 4), (4,10), (8,7), (8, 6), (6, 5), (5, 4), (4, 0), (0, 1), (1, 2), (2, 3), (3, 7), (10, 9), (18, 20), (20, 16), (16, 18), (16, 22), (16, 14), (14, 12), (19, 17), (17, 15), (
-    15, 19), (15, 21), (15, 13), (13, 11), (12, 11), (12, 24), (11, 23), (24, 23), (24, 26), (26, 28), (28, 32), (32, 30), (30, 28), (23, 25), (25, 27), (27, 29), (29, 31), (31, 27)]
+player_tracker = PlayerTracker()
 
 
 def draw_landmarks_on_image(rgb_image, detection_result):
@@ -38,24 +45,27 @@ def draw_landmarks_on_image(rgb_image, detection_result):
 
 
 def detection_callback(result: mp.tasks.vision.PoseLandmarkerResult, output_image: mp.Image, timestamp_ms: int):
-  global set_pose_results_callback_global
+  global set_pose_results_callback_global, get_silhouette_enabled_callback_global
 
   if result.pose_landmarks:
-    landmark_list = result.pose_landmarks[0]
-
-    pose_line_list = []
-
-    for connection1, connection2 in connected_landmarks:
-      landmark1 = landmark_list[connection1]
-      landmark2 = landmark_list[connection2]
-      pose_line_list.append(((landmark1.x, landmark1.y, connection1), (landmark2.x, landmark2.y, connection2)))
+    # All players' landmarks as one players x 33 x (x, y) array, so the game can process them together
+    player_points = np.array([[(landmark.x, landmark.y) for landmark in landmark_list] for landmark_list in result.pose_landmarks])
+    player_points, player_ids = player_tracker.assign_player_ids(player_points)
+
+    silhouette_contours = []
+    # Outlines are only extracted for levels that use them, or always when the game cannot say
+    is_silhouette_enabled = get_silhouette_enabled_callback_global() if get_silhouette_enabled_callback_global else True
+    if EXTRACT_SILHOUETTE_CONTOURS and is_silhouette_enabled and result.segmentation_masks:
+      # One outline around every player, from the union of their masks
+      segmentation_mask = np.max([mask.numpy_view() for mask in result.segmentation_masks], axis=0)
+      silhouette_contours = get_silhouette_contours(segmentation_mask)
 
     annotated_image = draw_landmarks_on_image(output_image.numpy_view(), result)
     # segmentation_mask = result.segmentation_masks[0].numpy_view()
     # visualized_mask = np.repeat(segmentation_mask[:, :, np.newaxis], 3, axis=2) * 255
     bgr_annotated_frame = cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR)
     # bgr_annotated_frame = visualized_mask
-    set_pose_results_callback_global((bgr_annotated_frame, pose_line_list))
+    set_pose_results_callback_global(get_pose_results_from_players(bgr_annotated_frame, player_points, player_ids, silhouette_contours))
 
 
 BaseOptions = mp.tasks.BaseOptions
@@ -67,37 +77,43 @@ VisionRunningMode = mp.tasks.vision.RunningMode
 options = PoseLandmarkerOptions(
     base_options=BaseOptions(model_asset_path=POSE_DETECTION_MODEL_ASSET_PATH),
     running_mode=VisionRunningMode.LIVE_STREAM,
+    num_poses=NUM_POSES,
     output_segmentation_masks=True,
     result_callback=detection_callback)
 
 
-def start_pose_detection(set_pose_results_callback):
+def start_pose_detection(set_pose_results_callback, get_inference_scale_callback=None, camera_config_path=CAMERA_CONFIG_PATH, get_silhouette_enabled_callback=None):
 
-  global set_pose_results_callback_global
+  global set_pose_results_callback_global, get_silhouette_enabled_callback_global
 
   set_pose_results_callback_global = set_pose_results_callback
+  get_silhouette_enabled_callback_global = get_silhouette_enabled_callback
 
-  cap = cv2.VideoCapture(0)
+  camera = open_camera(load_camera_config(camera_config_path))
 
   with PoseLandmarker.create_from_options(options) as detector:
     timestamp = 0
     while True:
       # Read a frame from the webcam
-      ret, frame = cap.read()
+      ret, frame = camera.read()
 
       if not ret:
+        # A video file that is not looped stops detection when it runs out
+        if camera.is_ended:
+          break
         continue
 
+      # Landmarks are normalised, so a smaller frame only changes the inference cost and preview size
+      inference_scale = get_inference_scale_callback() if get_inference_scale_callback else 1.0
+      if inference_scale < 1.0:
+        frame = cv2.resize(frame, None, fx=inference_scale, fy=inference_scale, interpolation=cv2.INTER_AREA)
+
       mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
 
       # timestamp = int(time.time() * 1000)
       # timestamp = int(cap.get(cv2.CAP_PROP_POS_MSEC))
-      fps = cap.get(cv2.CAP_PROP_FPS)
-      if fps:
-        timestamp += int(1000 / fps)
-      else:
-        # Assume 30 fps
-        timestamp += 33
+      # The negotiated frame rate, or 30 fps if the source does not report one
+      timestamp += int(1000 / camera.fps)
 
 
       # Process the frame with MediaPipe Pose Landmark model.
@@ -107,5 +123,5 @@ def start_pose_detection(set_pose_results_callback):
         break
 
   # Release the webcam and close the OpenCV window
-  cap.release()
+  camera.release()
   cv2.destroyAllWindows()
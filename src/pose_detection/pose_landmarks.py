@@ -0,0 +1,45 @@
+import dataclasses
+
+import numpy as np
+
+connected_landmarks = [(20, 4), (19, 4), (4,10), (8,7), (8, 6), (6, 5), (5, 4), (4, 0), (0, 1), (1, 2), (2, 3), (3, 7), (10, 9), (18, 20), (20, 16), (16, 18), (16, 22), (16, 14), (14, 12), (19, 17), (17, 15), (
+    15, 19), (15, 21), (15, 13), (13, 11), (12, 11), (12, 24), (11, 23), (24, 23), (24, 26), (26, 28), (28, 32), (32, 30), (30, 28), (23, 25), (25, 27), (27, 29), (29, 31), (31, 27)]
+POSE_LANDMARK_COUNT = 33
+
+
+@dataclasses.dataclass
+class PoseResults:
+  image: any
+  pose_lines: list
+  silhouette_contours: list = dataclasses.field(default_factory=list)
+  # players x 33 x (x, y) landmarks of every tracked player, ordered by player ID, and the ID of each.
+  # pose_lines holds the lines of the first of these players.
+  player_points: np.ndarray = dataclasses.field(default_factory=lambda: np.empty((0, POSE_LANDMARK_COUNT, 2)))
+  player_ids: list = dataclasses.field(default_factory=list)
+
+
+def get_pose_results_from_players(image, player_points, player_ids, silhouette_contours=()):
+  player_points = np.asarray(player_points, dtype=np.float64).reshape(-1, POSE_LANDMARK_COUNT, 2)
+  pose_lines = get_pose_lines_from_points(player_points[0]) if len(player_points) else []
+  return PoseResults(image, pose_lines, list(silhouette_contours), player_points, list(player_ids))
+
+
+def get_pose_lines_from_points(points):
+  # points holds an (x, y, ...) entry for each of the 33 pose landmarks
+  pose_line_list = []
+
+  for connection1, connection2 in connected_landmarks:
+    point1 = points[connection1]
+    point2 = points[connection2]
+    pose_line_list.append(((float(point1[0]), float(point1[1]), connection1), (float(point2[0]), float(point2[1]), connection2)))
+
+  return pose_line_list
+
+
+def get_points_from_pose_lines(pose_lines):
+  # The inverse of get_pose_lines_from_points, with NaN for landmarks that are not in any line
+  points = np.full((POSE_LANDMARK_COUNT, 2), np.nan)
+  for (start_position_x, start_position_y, connection1), (end_position_x, end_position_y, connection2) in pose_lines:
+    points[connection1] = start_position_x, start_position_y
+    points[connection2] = end_position_x, end_position_y
+  return points
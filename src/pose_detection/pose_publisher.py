@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from pose_detection.camera_capture import CAMERA_CONFIG_PATH
+from pose_detection.pose_landmarks import PoseResults, get_pose_results_from_players
+
+POSE_PUBLISHER_SOCKET_PATH = "/tmp/reflect_upon_your_actions_pose.sock"
+SUBSCRIBER_RECONNECT_DELAY = 1.0
+
+# Each message is: header length, frame length (little-endian uint32s), JSON header, raw frame bytes.
+# The header holds every player's landmarks and ID, the silhouette contours and the frame's shape and dtype.
+MESSAGE_LENGTHS_FORMAT = "<II"
+
+
+def encode_pose_results(pose_results: PoseResults):
+  frame = np.ascontiguousarray(pose_results.image)
+
+  header = json.dumps({"player_points": pose_results.player_points.tolist(), "player_ids": pose_results.player_ids,
+                       "silhouette_contours": pose_results.silhouette_contours, "shape": frame.shape, "dtype": str(frame.dtype)}).encode()
+  frame_bytes = frame.tobytes()
+
+  return struct.pack(MESSAGE_LENGTHS_FORMAT, len(header), len(frame_bytes)) + header + frame_bytes
+
+
+def receive_exactly(connection, length):
+  message = bytearray(length)
+  view = memoryview(message)
+  received = 0
+  while received < length:
+    chunk_length = connection.recv_into(view[received:])
+    if chunk_length == 0:
+      raise ConnectionError("Pose publisher closed the connection")
+    received += chunk_length
+  return message
+
+
+def receive_pose_results(connection):
+  header_length, frame_length = struct.unpack(MESSAGE_LENGTHS_FORMAT, receive_exactly(connection, struct.calcsize(MESSAGE_LENGTHS_FORMAT)))
+  header = json.loads(receive_exactly(connection, header_length))
+  frame = np.frombuffer(receive_exactly(connection, frame_length), dtype=header["dtype"]).reshape(header["shape"])
+
+  silhouette_contours = [[tuple(point) for point in contour] for contour in header["silhouette_contours"]]
+  return get_pose_results_from_players(frame, header["player_points"], header["player_ids"], silhouette_contours)
+
+
+# --- Publisher ---
+
+
+class PoseSubscriberConnection:
+  """
+  A subscribed game process. Only the latest message is kept for it, so a slow subscriber skips frames
+  rather than stalling the publisher or the other subscribers.
+  """
+
+  def __init__(self, connection):
+    self.connection = connection
+    self.condition = threading.Condition()
+    self.pending_message = None
+    self.is_connected = True
+    threading.Thread(daemon=True, target=self.send_messages).start()
+
+  def publish(self, message):
+    with self.condition:
+      self.pending_message = message
+      self.condition.notify()
+
+  def send_messages(self):
+    while True:
+      with self.condition:
+        while self.pending_message is None:
+          self.condition.wait()
+        message, self.pending_message = self.pending_message, None
+      try:
+        self.connection.sendall(message)
+      except OSError:
+        self.is_connected = False
+        self.connection.close()
+        return
+
+
+subscribers = []
+subscribers_lock = threading.Lock()
+
+
+def accept_subscribers(server):
+  while True:
+    connection, _ = server.accept()
+    with subscribers_lock:
+      subscribers.append(PoseSubscriberConnection(connection))
+      print(f"Pose subscriber joined ({len(subscribers)} connected)")
+
+
+def publish_pose_results_callback(pose_results):
+  # Encoded once, then shared by every subscriber
+  message = encode_pose_results(pose_results)
+
+  with subscribers_lock:
+    subscribers[:] = [subscriber for subscriber in subscribers if subscriber.is_connected]
+    for subscriber in subscribers:
+      subscriber.publish(message)
+
+
+def start_pose_publisher(socket_path=POSE_PUBLISHER_SOCKET_PATH, camera_config_path=CAMERA_CONFIG_PATH):
+  # Subscribers only need this module, so mediapipe is only imported by the publisher
+  from pose_detection.pose_detection import start_pose_detection
+
+  if os.path.exists(socket_path):
+    os.unlink(socket_path)
+
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  server.bind(socket_path)
+  server.listen()
+  threading.Thread(daemon=True, target=accept_subscribers, args=(server,)).start()
+
+  print(f"Publishing poses on {socket_path}")
+  try:
+    start_pose_detection(publish_pose_results_callback, camera_config_path=camera_config_path)
+  finally:
+    server.close()
+    os.unlink(socket_path)
+
+
+# --- Subscriber ---
+
+
+def start_pose_subscriber(set_pose_results_callback, socket_path=POSE_PUBLISHER_SOCKET_PATH):
+  # Runs in place of start_pose_detection, reconnecting whenever the publisher is not available
+  while True:
+    try:
+      with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        while True:
+          set_pose_results_callback(receive_pose_results(connection))
+    except OSError:
+      time.sleep(SUBSCRIBER_RECONNECT_DELAY)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run pose detection once, and publish frames and landmarks to any number of game processes.")
+  parser.add_argument("--socket", default=POSE_PUBLISHER_SOCKET_PATH, help="Unix domain socket path to publish on")
+  parser.add_argument("--camera-config", default=CAMERA_CONFIG_PATH, help="JSON file of camera capture settings")
+  args = parser.parse_args()
+
+  start_pose_publisher(args.socket, args.camera_config)
@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+
+# When run by the game, outlines are only extracted for levels with "silhouette_colliders". Set to False to never extract them.
+EXTRACT_SILHOUETTE_CONTOURS = True
+SILHOUETTE_MASK_SCALE = 0.25
+SILHOUETTE_MASK_THRESHOLD = 0.5
+SILHOUETTE_MIN_AREA = 0.002
+SILHOUETTE_SIMPLIFY_TOLERANCE = 0.005
+SILHOUETTE_MAX_VERTICES = 64
+
+
+def get_silhouette_contours(segmentation_mask):
+  """
+  Extracts simplified outlines of the player from a pose segmentation mask.
+
+  :param segmentation_mask: A 2D float array of per-pixel person confidence in [0, 1].
+  :return: A list of closed contours, each a list of (x, y) points normalised to [0, 1] like the pose landmarks,
+           with no more than SILHOUETTE_MAX_VERTICES points in total.
+  """
+  # Extracting at reduced resolution keeps this cheap enough to run on the pose thread every frame
+  small_mask = cv2.resize(segmentation_mask, None, fx=SILHOUETTE_MASK_SCALE, fy=SILHOUETTE_MASK_SCALE, interpolation=cv2.INTER_AREA)
+  small_height, small_width = small_mask.shape[:2]
+  binary_mask = (small_mask > SILHOUETTE_MASK_THRESHOLD).astype(np.uint8)
+
+  contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+  min_area = SILHOUETTE_MIN_AREA * small_width * small_height
+  contours = sorted((contour for contour in contours if cv2.contourArea(contour) >= min_area), key=cv2.contourArea, reverse=True)
+
+  # Douglas-Peucker, loosening the tolerance until the outlines fit in the vertex budget
+  epsilon = SILHOUETTE_SIMPLIFY_TOLERANCE * max(small_width, small_height)
+  simplified_contours = [cv2.approxPolyDP(contour, epsilon, True) for contour in contours]
+  while sum(len(contour) for contour in simplified_contours) > SILHOUETTE_MAX_VERTICES and epsilon < max(small_width, small_height):
+    epsilon *= 1.5
+    simplified_contours = [cv2.approxPolyDP(contour, epsilon, True) for contour in contours]
+
+  # Keep the largest outlines if the budget still cannot fit them all
+  silhouette_contours = []
+  vertex_count = 0
+  for contour in simplified_contours:
+    if len(contour) < 3 or vertex_count + len(contour) > SILHOUETTE_MAX_VERTICES:
+      continue
+    vertex_count += len(contour)
+    points = contour.reshape(-1, 2) / (small_width, small_height)
+    silhouette_contours.append([(round(float(x), 4), round(float(y), 4)) for x, y in points])
+
+  return silhouette_contours
@@ -0,0 +1,39 @@
+import os
+
+# Replays run headless: the game modules open a display when imported
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import sys
+
+from main_game.session_recording import compare_checksum_files, replay_session
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Deterministically replay a recorded game session, or compare the checksums of two replays.")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+
+  replay_parser = subparsers.add_parser("replay", help="replay a session file and check it against the recording")
+  replay_parser.add_argument("session", help="session file written by main.py --record-session")
+  replay_parser.add_argument("--checksums", default=None, help="write this run's checksums to a file")
+
+  compare_parser = subparsers.add_parser("compare", help="compare the checksum files of two replays")
+  compare_parser.add_argument("first_checksums")
+  compare_parser.add_argument("second_checksums")
+
+  args = parser.parse_args()
+
+  if args.command == "replay":
+    return 1 if replay_session(args.session, args.checksums) else 0
+
+  first_difference = compare_checksum_files(args.first_checksums, args.second_checksums)
+  if first_difference is None:
+    print("Checksums match")
+    return 0
+  print(f"Checksums first differ at frame {first_difference}")
+  return 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
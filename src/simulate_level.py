@@ -0,0 +1,65 @@
+import os
+
+# Simulations run headless: the game modules open a display when imported
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from main_game.globals import SIMULATION_MAX_FRAMES, level_data
+from main_game.level_simulation import (get_random_limb_placements,
+                                        simulate_level)
+
+
+def run_simulation(simulation):
+  # Runs in a worker process, each of which holds its own physics space
+  current_level, limb_lines, landmarks_path, max_frames, seed = simulation
+  reached_flag, frames, seconds = simulate_level(current_level, limb_lines, landmarks_path, max_frames, seed)
+  return {"limb_lines": limb_lines, "pose_clip": landmarks_path, "seed": seed,
+          "reached_flag": reached_flag, "frames": frames, "seconds": seconds}
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Check whether a level can be solved, by simulating limb placements or pose clips in parallel.")
+  parser.add_argument("level", help="level name in levels.json, e.g. level_3")
+  parser.add_argument("--placements", type=int, default=200, help="number of random limb placements to try")
+  parser.add_argument("--limbs", type=int, default=2, help="number of limbs in each placement")
+  parser.add_argument("--pose-clips", nargs="*", default=[], help="landmark caches to replay instead of random limb placements")
+  parser.add_argument("--max-frames", type=int, default=SIMULATION_MAX_FRAMES)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--workers", type=int, default=None, help="number of worker processes (defaults to the number of cores)")
+  parser.add_argument("--output", default=None, help="write every result to a JSON file")
+  args = parser.parse_args()
+
+  if args.level not in level_data:
+    parser.error(f"unknown level {args.level}")
+  # Limbs only become colliders inside a level's grids, so a level without grids cannot be played with the body
+  if not level_data[args.level].get("grids"):
+    parser.error(f"level {args.level} has no grids, so limbs never reach the game")
+
+  if args.pose_clips:
+    simulations = [(args.level, [], landmarks_path, args.max_frames, args.seed) for landmarks_path in args.pose_clips]
+  else:
+    placements = get_random_limb_placements(args.level, args.placements, args.limbs, args.seed)
+    simulations = [(args.level, limb_lines, None, args.max_frames, args.seed) for limb_lines in placements]
+
+  with ProcessPoolExecutor(max_workers=args.workers) as executor:
+    results = list(executor.map(run_simulation, simulations, chunksize=max(1, len(simulations) // 64)))
+
+  solutions = sorted((result for result in results if result["reached_flag"]), key=lambda result: result["frames"])
+  total_seconds = sum(result["seconds"] for result in results)
+
+  print(f"{args.level}: {len(solutions)}/{len(results)} configurations reached the flag ({total_seconds:.1f}s of simulation)")
+  for result in solutions[:10]:
+    limb_lines = [[(round(x, 3), round(y, 3)) for x, y in limb_line] for limb_line in result["limb_lines"]]
+    print(f"  {result['frames'] / 60:6.2f}s  {result['pose_clip'] or limb_lines}")
+
+  if args.output:
+    with open(args.output, 'w') as file:
+      json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+  main()
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def line_clip(line, box):
     """
     Implements the Cohen-Sutherland algorithm for line clipping against a rectangular box.
@@ -91,6 +94,61 @@ def clip_lines_within_box(lines, box):
             clipped_lines.append(clipped_line)
     return clipped_lines
 
+def clip_line_array(lines, box):
+    """
+    Clips an array of lines to a box with the same Cohen-Sutherland steps as line_clip, on all lines at once.
+
+    :param lines: A numpy array of shape (n, 2, 2) holding the start and end points of each line.
+    :param box: A tuple of the top-left and bottom-right corners of the box ((x_min, y_min), (x_max, y_max)), where each
+                coordinate can also be an array of shape (n,) to clip every line to its own box.
+    :return: A tuple of the clipped lines, shape (n, 2, 2), and a boolean array of shape (n,) that is True for the
+             lines that lie within the box. Clipped coordinates of rejected lines are meaningless.
+    """
+
+    INSIDE, LEFT, RIGHT, BOTTOM, TOP = 0, 1, 2, 4, 8
+
+    (x_min, y_min), (x_max, y_max) = box
+    lines = np.array(lines, dtype=np.float64).reshape(-1, 2, 2)
+    x0, y0, x1, y1 = lines[:, 0, 0], lines[:, 0, 1], lines[:, 1, 0], lines[:, 1, 1]
+
+    def compute_outcodes(x, y):
+        return (INSIDE | np.where(x < x_min, LEFT, np.where(x > x_max, RIGHT, INSIDE))
+                | np.where(y < y_min, BOTTOM, np.where(y > y_max, TOP, INSIDE)))
+
+    outcode0 = compute_outcodes(x0, y0)
+    outcode1 = compute_outcodes(x1, y1)
+
+    # Lines with a NaN coordinate are rejected, rather than compared as inside
+    accepted = np.zeros(len(lines), dtype=bool)
+    rejected = np.isnan(lines).any(axis=(1, 2))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        while True:
+            accepted |= ~rejected & ((outcode0 | outcode1) == 0)
+            rejected |= ~accepted & ((outcode0 & outcode1) != 0)
+            pending = ~(accepted | rejected)
+            if not pending.any():
+                break
+
+            # Choose the point to clip, then clip it against its first outside edge, in line_clip's order
+            clip_start = pending & (outcode0 != 0)
+            outcode_out = np.where(clip_start, outcode0, outcode1)
+
+            x = np.where(outcode_out & TOP, x0 + (x1 - x0) * (y_max - y0) / (y1 - y0),
+                np.where(outcode_out & BOTTOM, x0 + (x1 - x0) * (y_min - y0) / (y1 - y0),
+                np.where(outcode_out & RIGHT, x_max, x_min)))
+            y = np.where(outcode_out & TOP, y_max,
+                np.where(outcode_out & BOTTOM, y_min,
+                np.where(outcode_out & RIGHT, y0 + (y1 - y0) * (x_max - x0) / (x1 - x0), y0 + (y1 - y0) * (x_min - x0) / (x1 - x0))))
+
+            clip_end = pending & ~clip_start
+            x0, y0 = np.where(clip_start, x, x0), np.where(clip_start, y, y0)
+            x1, y1 = np.where(clip_end, x, x1), np.where(clip_end, y, y1)
+            outcode0 = np.where(clip_start, compute_outcodes(x0, y0), outcode0)
+            outcode1 = np.where(clip_end, compute_outcodes(x1, y1), outcode1)
+
+    return np.stack((np.stack((x0, y0), axis=1), np.stack((x1, y1), axis=1)), axis=1), accepted
+
 if __name__ == "__main__":
     # Test 1
     lines = [((100, 100), (200, 200)), ((200, 200), (300, 300))]
@@ -103,3 +161,7 @@ if __name__ == "__main__":
     box = ((1, 1), (6, 6))
     clipped_lines = clip_lines_within_box(lines, box)
     print(f"Clipped lines: {clipped_lines} (expected [((3.25, 1), (4.5, 6))])")
+
+    # Test 3
+    clipped_lines, inside = clip_line_array(lines, box)
+    print(f"Clipped lines: {clipped_lines[inside].tolist()} (expected [[[3.25, 1.0], [4.5, 6.0]]])")
@@ -0,0 +1,33 @@
+import sys
+import tracemalloc
+
+
+def diff_memory_snapshots(old_snapshot_path, new_snapshot_path, key_type="lineno", limit=20):
+    """
+    Compares two tracemalloc snapshots written by the memory tracking mode.
+
+    :param old_snapshot_path: Path of the earlier snapshot.
+    :param new_snapshot_path: Path of the later snapshot.
+    :param key_type: How allocations are grouped ("lineno", "filename" or "traceback").
+    :param limit: The number of largest differences to return.
+    :return: A list of tracemalloc.StatisticDiff, largest growth first.
+    """
+    old_snapshot = tracemalloc.Snapshot.load(old_snapshot_path)
+    new_snapshot = tracemalloc.Snapshot.load(new_snapshot_path)
+
+    # Ignore allocations made by tracemalloc itself
+    snapshot_filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    old_snapshot = old_snapshot.filter_traces(snapshot_filters)
+    new_snapshot = new_snapshot.filter_traces(snapshot_filters)
+
+    return new_snapshot.compare_to(old_snapshot, key_type)[:limit]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python -m utils.diff_memory_snapshots <old.tracemalloc> <new.tracemalloc> [limit]")
+        sys.exit(1)
+
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    for statistic_diff in diff_memory_snapshots(sys.argv[1], sys.argv[2], limit=limit):
+        print(statistic_diff)
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def scale_and_translate_lines(lines, box_x, box_y):
     """
     Scale and translate lines from box X to fit within box Y, maintaining their relative size and position.
@@ -32,11 +35,37 @@ def scale_and_translate_lines(lines, box_x, box_y):
 
     return scaled_and_translated_lines
 
-# Define boxes and lines
-box_x = ((100, 100), (250, 250))
-box_y = ((200, 200), (450, 450))
-lines = [((100, 100), (200, 200)), ((150, 150), (250, 250))]
+def scale_and_translate_line_array(lines, box_x, box_y):
+    """
+    Scale and translate an array of lines from box X to fit within box Y, like scale_and_translate_lines.
+
+    :param lines: A numpy array of shape (n, 2, 2) holding the start and end points of each line, lying strictly within box X.
+    :param box_x: The original box defined by the top-left and bottom-right coordinates, which can be arrays of shape (n,).
+    :param box_y: The target box defined by the top-left and bottom-right coordinates, which can be arrays of shape (n,).
+    :return: A numpy array of shape (n, 2, 2) of the lines scaled and translated to fit within box Y.
+    """
+
+    (x_min_x, y_min_x), (x_max_x, y_max_x) = box_x
+    (x_min_y, y_min_y), (x_max_y, y_max_y) = box_y
+
+    scale_x = (x_max_y - x_min_y) / (x_max_x - x_min_x)
+    scale_y = (y_max_y - y_min_y) / (y_max_x - y_min_x)
+
+    translate_x = x_min_y - (x_min_x * scale_x)
+    translate_y = y_min_y - (y_min_x * scale_y)
 
-# Scale and translate lines
-scaled_and_translated_lines = scale_and_translate_lines(lines, box_x, box_y)
-scaled_and_translated_lines
+    # Shaped (n or 1) x 1 x (x, y), to broadcast over the start and end point of each line
+    scale = np.stack(np.broadcast_arrays(scale_x, scale_y), axis=-1).reshape(-1, 1, 2)
+    translate = np.stack(np.broadcast_arrays(translate_x, translate_y), axis=-1).reshape(-1, 1, 2)
+
+    return (np.asarray(lines) * scale) + translate
+
+if __name__ == "__main__":
+    # Define boxes and lines
+    box_x = ((100, 100), (250, 250))
+    box_y = ((200, 200), (450, 450))
+    lines = [((100, 100), (200, 200)), ((150, 150), (250, 250))]
+
+    # Scale and translate lines
+    scaled_and_translated_lines = scale_and_translate_lines(lines, box_x, box_y)
+    print(f"Scaled lines: {scaled_and_translated_lines} (expected [((200.0, 200.0), (366.6666666666667, 366.6666666666667)), ((283.3333333333333, 283.3333333333333), (450.0, 450.0))])")